@@ -1,20 +1,34 @@
 import asyncio
 import random
+import time
 
 from typing import List, Any, Set, Optional, Callable, Coroutine
 from loguru import logger
 
 from core.modules.executor import ModuleExecutor
-from loader import config, file_operations, semaphore, proxy_manager
+from loader import config, file_operations, semaphore, proxy_manager, captcha_solver, mail_parser, imap_pool
 from models import Account
-from utils import Progress
+from utils import Progress, metrics, used_codes, ProxyChecker, ConfigLoader, LineFileWatcher, LinesDiff, proxy_table
 from console import Console
-from database import initialize_database, Accounts
+from database import initialize_database, close_database, Accounts, UsedCodes
+
+
+_pending_writes: Set[asyncio.Task] = set()
+
+
+def _persist_used_code(key: tuple[str, str, str], claimed_at: float) -> None:
+    task = asyncio.create_task(UsedCodes.add(*key, claimed_at))
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
 
 
 class ApplicationManager:
+    RUNTIME_SUMMARY_INTERVAL = 300
+
     def __init__(self):
         self.accounts_with_initial_delay: Set[str] = set()
+        self._reloader: Optional[asyncio.Task] = None
+        self._summary_logged_at = time.monotonic()
         self.module_map = {
             "login": (config.accounts_to_login, self._execute_module_for_accounts),
             "farm": (config.accounts_to_farm, self._farm_continuously),
@@ -29,6 +43,11 @@ class ApplicationManager:
         logger.success(f"Database initialized")
         await file_operations.setup_files()
 
+        if config.imap_settings.persist_used_codes:
+            await UsedCodes.purge(used_codes.ttl)
+            used_codes.load(await UsedCodes.get_recent(used_codes.ttl))
+            used_codes.listener = _persist_used_code
+
 
     async def _execute_module_for_accounts(
         self, accounts: List[Account], module_name: str
@@ -40,13 +59,101 @@ class ApplicationManager:
         if module_name == "export_stats":
             await file_operations.setup_stats()
 
+        captcha_counters_before, balance_before = None, None
+        if module_name == "login":
+            captcha_counters_before = metrics.snapshot()["counters"]
+            balance_before = await self._get_captcha_balance()
+
         tasks = []
         for account in accounts:
             executor = ModuleExecutor(account)
             module_func = getattr(executor, f"_process_{module_name}")
             tasks.append(self._safe_execute_module(account, module_func, progress))
 
-        return await asyncio.gather(*tasks)
+        results = await asyncio.gather(*tasks)
+
+        if module_name == "login":
+            await self._log_captcha_summary(captcha_counters_before, balance_before)
+        if module_name != "farm":
+            self._log_runtime_summary()
+
+        return results
+
+    @staticmethod
+    async def _get_captcha_balance() -> Optional[float]:
+        success, balance = await captcha_solver.get_balance()
+        if not success:
+            logger.warning(f"Unable to get captcha balance: {balance}")
+            return None
+
+        return balance
+
+    async def _log_captcha_summary(self, counters_before: dict, balance_before: Optional[float]) -> None:
+        counters = metrics.snapshot()["counters"]
+
+        def delta(name: str) -> float:
+            return counters.get(name, 0) - counters_before.get(name, 0)
+
+        solves = int(delta("captcha.solves"))
+        solved = int(delta("captcha.solves.success"))
+        logins = int(delta("login.success"))
+        failures = {
+            name.rsplit(".", 1)[-1]: int(delta(name))
+            for name in counters
+            if name.startswith("captcha.failures.") and delta(name) > 0
+        }
+
+        latency = metrics.histogram("captcha.solve_seconds")
+        latency_info = (
+            f"p50: {latency['p50']}s, p95: {latency['p95']}s, max: {latency['max']:.1f}s"
+            if latency else "n/a"
+        )
+
+        wait = metrics.histogram("captcha.wait_seconds")
+        wait_info = f"p50: {wait['p50']}s, p95: {wait['p95']}s" if wait else "n/a"
+
+        logger.info(
+            f"Captcha summary | Solves: {solved}/{solves} | Attempts: {int(delta('captcha.attempts'))} | "
+            f"Latency (session): {latency_info} | Slot wait (session): {wait_info} | Failures: {failures or 'none'}"
+        )
+
+        balance_after = await self._get_captcha_balance() if balance_before is not None else None
+        if balance_after is None:
+            return
+
+        spent = max(balance_before - balance_after, 0.0)
+        metrics.increment("captcha.spent", spent)
+
+        if logins:
+            cost_per_login = spent / logins
+            metrics.set_gauge("captcha.cost_per_login", cost_per_login)
+            logger.info(f"Captcha cost | Spent: {spent:.4f} | Successful logins: {logins} | Per login: {cost_per_login:.4f}")
+        else:
+            logger.info(f"Captcha cost | Spent: {spent:.4f} | No successful logins in this batch")
+
+    def _log_runtime_summary(self) -> None:
+        self._summary_logged_at = time.monotonic()
+        snapshot = metrics.snapshot()
+        counters, gauges = snapshot["counters"], snapshot["gauges"]
+
+        def count(name: str) -> int:
+            return int(counters.get(name, 0))
+
+        def latency(name: str) -> str:
+            histogram = snapshot["histograms"].get(name)
+            return f"p50: {histogram['p50']}s, p95: {histogram['p95']}s" if histogram else "n/a"
+
+        logger.info(
+            f"Proxy summary | Waiting: {int(gauges.get('proxy.waiters', 0))} | Wait: {latency('proxy.wait_seconds')} | "
+            f"Timed out: {count('proxy.exhausted')} | Failures: {count('proxy.failures')} | Quarantines: {count('proxy.quarantines')} | "
+            f"Capacity lowered: {count('proxy.capacity_lowered')}"
+        )
+        logger.info(
+            f"IMAP summary | Logins: {count('imap.logins')} | Pool hits/misses: {count('imap.pool.hits')}/{count('imap.pool.misses')} | "
+            f"Idle: {int(gauges.get('imap.pool.idle', 0))} | Throttled: {count('imap.throttled')} | "
+            f"Host slot wait: {latency('imap.governor.wait_seconds')} | Evictions: {count('imap.governor.evictions')} | "
+            f"Cached validations: {count('imap.validation.cached')}"
+        )
 
     async def _safe_execute_module(
             self, account: Account, module_func: Callable, progress: Progress
@@ -100,13 +207,120 @@ class ApplicationManager:
             else:
                 logger.info(f"{accounts_waiting_sleep} accounts are sleeping. Waiting for any account to wake up.")
 
+            if time.monotonic() - self._summary_logged_at >= self.RUNTIME_SUMMARY_INTERVAL:
+                self._log_runtime_summary()
+
             await asyncio.sleep(10)
 
+    @staticmethod
+    async def _check_proxies() -> None:
+        settings = config.proxy_check_settings
+        checker = ProxyChecker(
+            concurrency=settings.concurrency,
+            timeout=settings.timeout,
+            cache_file=settings.cache_file,
+            cache_ttl=settings.cache_ttl,
+        )
+
+        logger.info(f"Checking {len(proxy_manager.proxies)} proxies..")
+        results = await checker.check_all(list(proxy_manager.proxies.values()))
+        proxy_manager.apply_check_results({
+            url: result.latency if result.alive else None
+            for url, result in results.items()
+        })
+
+        alive = sum(1 for result in results.values() if result.alive)
+        logger.success(f"Proxies checked | Alive: {alive} | Dead: {len(results) - alive}")
+
+    @staticmethod
+    def _parse_proxy_lines(lines: List[str]) -> List[str]:
+        proxies = []
+        for line in lines:
+            try:
+                proxies.append(proxy_table.url(line))
+            except Exception as e:
+                logger.warning(f"Hot reload | Invalid proxy skipped: {line} | {e}")
+
+        return proxies
+
+    async def _apply_proxies_diff(self, diff: LinesDiff) -> None:
+        added = self._parse_proxy_lines(diff.added)
+        removed = set(self._parse_proxy_lines(diff.removed)) - set(added)
+
+        if removed:
+            config.proxies[:] = [proxy for proxy in config.proxies if proxy not in removed]
+            for proxy in removed:
+                await proxy_manager.drain_proxy(proxy)
+
+        new_count = await proxy_manager.add_proxies(added)
+        known = set(config.proxies)
+        config.proxies.extend(proxy for proxy in added if proxy not in known)
+        logger.info(f"Hot reload | proxies.txt | Added: {new_count} | Removed: {len(removed)} | Total: {len(config.proxies)}")
+
+    @staticmethod
+    async def _apply_farm_accounts_diff(diff: LinesDiff) -> None:
+        imap_settings = config.imap_settings
+        added = []
+        for line in diff.added:
+            try:
+                account = ConfigLoader.parse_account(line, "default_accounts")
+            except Exception as e:
+                logger.warning(f"Hot reload | Invalid account skipped: {line} | {e}")
+                continue
+
+            # Same server assignment as ConfigLoader.load, but one unsupported domain only skips its account
+            if imap_settings.use_single_imap.enable:
+                ConfigLoader._assign_imap_server([account], imap_settings.use_single_imap.imap_server)
+            else:
+                try:
+                    ConfigLoader.validate_domains([account], imap_settings.servers)
+                except ValueError as e:
+                    logger.warning(f"Hot reload | Account: {account.email} | {e}")
+                    continue
+
+            added.append(account)
+
+        removed = {ConfigLoader.parse_account(line, "default_accounts").email for line in diff.removed}
+        removed -= {account.email for account in added}
+
+        # The farm loop iterates this very list, so it is changed in place
+        accounts = config.accounts_to_farm
+        if removed:
+            accounts[:] = [account for account in accounts if account.email not in removed]
+        known = {account.email for account in accounts}
+        accounts.extend(account for account in added if account.email not in known)
+        logger.info(f"Hot reload | farm_accounts.txt | Added: {len(added)} | Removed: {len(removed)} | Total: {len(accounts)}")
+
+    async def _watch_files(self, interval: float) -> None:
+        data_path = ConfigLoader().data_path
+        watchers = {
+            LineFileWatcher(data_path / "proxies.txt"): self._apply_proxies_diff,
+            LineFileWatcher(data_path / "farm_accounts.txt"): self._apply_farm_accounts_diff,
+        }
+        for watcher in watchers:
+            watcher.prime()
+
+        while True:
+            await asyncio.sleep(interval)
+            for watcher, apply in watchers.items():
+                try:
+                    diff = watcher.poll()
+                    if diff:
+                        await apply(diff)
+                except Exception as e:
+                    logger.error(f"Hot reload of {watcher.path.name} failed: {e}")
+
+    def _start_reloader(self) -> None:
+        interval = config.application_settings.hot_reload_interval
+        if interval > 0 and (self._reloader is None or self._reloader.done()):
+            self._reloader = asyncio.create_task(self._watch_files(interval))
+
     @staticmethod
     async def _clean_accounts_proxies() -> None:
         logger.info("Cleaning all accounts proxies..")
         try:
             cleared_count = await Accounts().clear_all_accounts_proxies()
+            proxy_manager.clear_assignments()
             logger.success(f"Successfully cleared proxies for {cleared_count} accounts")
 
         except Exception as e:
@@ -115,6 +329,14 @@ class ApplicationManager:
     async def run(self) -> None:
         await self.initialize()
 
+        try:
+            await self._run_modules()
+        finally:
+            mail_parser.close()
+            await imap_pool.close()
+            await close_database()
+
+    async def _run_modules(self) -> None:
         while True:
             Console().build()
 
@@ -128,6 +350,10 @@ class ApplicationManager:
                 break
 
             proxy_manager.load_proxy(config.proxies)
+            proxy_manager.load_assignments(await Accounts.get_proxy_assignments())
+            if config.proxy_check_settings.enabled and proxy_manager.proxies:
+                await self._check_proxies()
+            self._start_reloader()
             accounts, process_func = self.module_map[config.module]
             random.shuffle(accounts)
 
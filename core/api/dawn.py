@@ -1,5 +1,6 @@
 import asyncio
 import json
+import time
 import uuid
 
 from datetime import datetime, timezone
@@ -8,6 +9,8 @@ from typing import Literal
 import httpx
 from curl_cffi.requests import AsyncSession, Response
 from utils.processing.handlers import require_extension_token, require_session_token, require_privy_auth_token
+from utils.communication.logs import is_proxy_error
+from utils.managers.proxy_health import proxy_health
 from core.exceptions.base import APIError, SessionRateLimited, ServerError, ProxyForbidden, APIErrorType
 
 
@@ -82,6 +85,7 @@ class APIClient:
     ) -> dict | str | Response:
         for attempt in range(max_retries):
             try:
+                started = time.monotonic()
                 if request_type == "POST":
                     response = await self.session.post(
                         url,
@@ -104,8 +108,12 @@ class APIClient:
                         cookies=cookies,
                     )
 
+                proxy_forbidden = response.status_code == 403 and "403 Forbidden" in response.text
+                if not proxy_forbidden:
+                    proxy_health.record_success(self.proxy, time.monotonic() - started)
+
                 if verify:
-                    if response.status_code == 403 and "403 Forbidden" in response.text:
+                    if proxy_forbidden:
                         raise ProxyForbidden(f"Proxy forbidden - {response.status_code}")
 
                     elif response.status_code == 403:
@@ -131,10 +139,17 @@ class APIClient:
                     raise error
                 await asyncio.sleep(retry_delay)
 
-            except (APIError, SessionRateLimited, ProxyForbidden):
+            except ProxyForbidden:
+                proxy_health.record_failure(self.proxy)
+                raise
+
+            except (APIError, SessionRateLimited):
                 raise
 
             except Exception as error:
+                if is_proxy_error(error):
+                    proxy_health.record_failure(self.proxy)
+
                 if attempt == max_retries - 1:
                     raise ServerError(
                         f"Failed to send request after {max_retries} attempts: {error}"
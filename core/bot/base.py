@@ -1,18 +1,18 @@
 import asyncio
 import random
+import time
 import pytz
 
 from datetime import datetime, timedelta
 from typing import Optional, Literal
-from better_proxy import Proxy
 from loguru import logger
 
-from loader import config, file_operations, proxy_manager, captcha_solver
+from loader import config, file_operations, proxy_manager, captcha_solver, captcha_limiter, imap_pool, imap_folders, mail_parser, redirect_dispatcher
 from models import Account, OperationResult
 
 from core.api.dawn import DawnExtensionAPI
-from utils import EmailValidator, LinkExtractor, operation_failed, operation_success, validate_error, handle_sleep
-from database import Accounts
+from utils import EmailValidator, LinkExtractor, operation_failed, operation_success, validate_error, handle_sleep, metrics, IMAPLoginError, proxy_table
+from database import Accounts, EmailValidations
 from core.exceptions.base import APIError, APIErrorType, EmailValidationFailed, CaptchaSolvingFailed
 
 
@@ -43,49 +43,49 @@ class Bot:
             utc_duration = datetime.now(pytz.UTC) + duration
             await db_account_value.set_sleep_until(utc_duration)
 
-    @staticmethod
-    async def _prepare_account_proxy(db_account_value: Optional[Accounts]) -> Optional[str]:
-        while True:
-            if db_account_value:
-                proxy = db_account_value.active_account_proxy
-                if not proxy:
-                    proxy = await proxy_manager.get_proxy()
-                    proxy = proxy.as_url if isinstance(proxy, Proxy) else proxy
-
-                    if config.application_settings.check_uniqueness_of_proxies is True:
-                        in_use = await Accounts.filter(active_account_proxy=proxy).exists()
-                        if in_use:
-                            await proxy_manager.release_proxy(proxy)
-                            continue
-
-                    await db_account_value.update_account(proxy=proxy.as_url if isinstance(proxy, Proxy) else proxy)
-            else:
-                proxy = await proxy_manager.get_proxy()
-                proxy = proxy.as_url if isinstance(proxy, Proxy) else proxy
-
-                if config.application_settings.check_uniqueness_of_proxies is True:
-                    in_use = await Accounts.filter(active_account_proxy=proxy).exists()
-                    if in_use:
-                        await proxy_manager.release_proxy(proxy)
-                        continue
+    async def _prepare_account_proxy(self, db_account_value: Optional[Accounts]) -> Optional[str]:
+        if db_account_value and db_account_value.active_account_proxy:
+            return db_account_value.active_account_proxy
 
-            return proxy.as_url if isinstance(proxy, Proxy) else proxy
+        # Accounts that are not in the database yet keep the proxy picked on a previous attempt
+        proxy = proxy_manager.get_assigned_proxy(self.account_data.email)
+        if not proxy:
+            proxy = proxy_table.url(await proxy_manager.get_proxy(owner=self.account_data.email))
 
-    async def _validate_email(self, proxy: str = None) -> dict:
-        proxy = Proxy.from_str(proxy) if proxy else None
+        if db_account_value:
+            await db_account_value.update_account(proxy=proxy)
 
+        return proxy
+
+    def _imap_credentials(self) -> tuple[str, str, str]:
         if config.redirect_settings.enabled:
-            result = await EmailValidator(
-                config.redirect_settings.imap_server,
-                config.redirect_settings.email,
-                config.redirect_settings.password
-            ).validate(None if config.redirect_settings.use_proxy is False else proxy)
-        else:
-            result = await EmailValidator(
-                self.account_data.imap_server,
-                self.account_data.email,
-                self.account_data.email_password
-            ).validate(None if config.imap_settings.use_proxy_for_imap is False else proxy)
+            return config.redirect_settings.imap_server, config.redirect_settings.email, config.redirect_settings.password
+
+        return self.account_data.imap_server, self.account_data.email, self.account_data.email_password
+
+    async def _validate_email(self, proxy: str = None) -> dict:
+        proxy = proxy_table.proxy(proxy) if proxy else None
+        imap_server, email, password = self._imap_credentials()
+
+        if await EmailValidations.is_valid(imap_server, email, password, config.imap_settings.validation_cache_ttl):
+            metrics.increment("imap.validation.cached")
+            return {
+                "status": True,
+                "data": "Valid:cached",
+            }
+
+        use_proxy = config.redirect_settings.use_proxy if config.redirect_settings.enabled else config.imap_settings.use_proxy_for_imap
+        result = await EmailValidator(
+            imap_server,
+            email,
+            password,
+            pool=imap_pool,
+        ).validate(None if use_proxy is False else proxy)
+
+        if result["status"]:
+            await EmailValidations.mark_valid(imap_server, email, password)
+        elif result["data"] == "Invalid credentials":
+            await EmailValidations.invalidate(imap_server, email)
 
         return result
 
@@ -97,26 +97,38 @@ class Bot:
 
             logger.error(f"Account: {self.account_data.email} | Email is invalid: {result['data']}")
             return False
+
+        if result["data"] == "Valid:cached":
+            logger.info(f"Account: {self.account_data.email} | Email was validated recently, check skipped")
         return True
 
     async def _extract_link(self, proxy: str = None) -> dict:
+        proxy = proxy_table.proxy(proxy) if proxy else None
+
         if config.redirect_settings.enabled:
-            confirm_url = await LinkExtractor(
-                imap_server=config.redirect_settings.imap_server,
-                email=config.redirect_settings.email,
-                password=config.redirect_settings.password,
-                redirect_email=self.account_data.email
-            ).extract_link(None if config.imap_settings.use_proxy_for_imap is False else proxy)
+            confirm_url = await redirect_dispatcher.extract_link(
+                self.account_data.email,
+                None if config.redirect_settings.use_proxy is False else proxy,
+            )
         else:
             confirm_url = await LinkExtractor(
                 imap_server=self.account_data.imap_server,
                 email=self.account_data.email,
                 password=self.account_data.email_password,
+                pool=imap_pool,
+                folders=imap_folders,
+                parser=mail_parser,
+                use_idle=config.imap_settings.use_idle,
+                idle_rescan_interval=config.imap_settings.idle_rescan_interval,
             ).extract_link(None if config.imap_settings.use_proxy_for_imap is False else proxy)
 
         return confirm_url
 
-    async def _update_account_proxy(self, account_data: Accounts, attempt: int, max_attempts: int, proxy: str = None) -> None:
+    async def _update_account_proxy(self, account_data: Accounts, attempt: int, max_attempts: int, proxy: str = None, ip_limited: bool = False) -> None:
+        current_proxy = proxy or (account_data.active_account_proxy if account_data else proxy_manager.get_assigned_proxy(self.account_data.email))
+        if ip_limited and current_proxy:
+            proxy_manager.record_ip_limit(current_proxy)
+
         if config.application_settings.disable_auto_proxy_change is False:
             proxy_changed_log = (
                 f"Account: {self.account_data.email} | Proxy changed | "
@@ -124,16 +136,16 @@ class Bot:
                 f"Attempt: {attempt + 1}/{max_attempts}.."
             )
 
-            if proxy:
-                await proxy_manager.release_proxy(proxy)
+            if current_proxy:
+                await proxy_manager.release_proxy(current_proxy, owner=self.account_data.email)
 
             if not account_data:
                 logger.info(proxy_changed_log)
                 await asyncio.sleep(config.attempts_and_delay_settings.error_delay)
                 return
 
-            proxy = await proxy_manager.get_proxy()
-            await account_data.update_account_proxy(proxy.as_url if isinstance(proxy, Proxy) else proxy)
+            proxy = await proxy_manager.get_proxy(owner=self.account_data.email)
+            await account_data.update_account_proxy(proxy_table.url(proxy))
         else:
             proxy_changed_log = (
                 f"Account: {self.account_data.email} | Proxy change disabled | "
@@ -145,7 +157,15 @@ class Bot:
         await asyncio.sleep(config.attempts_and_delay_settings.error_delay)
 
     async def _get_confirmation_code(self, proxy: str = None) -> Optional[str]:
-        confirm_url = await self._extract_link(proxy)
+        try:
+            confirm_url = await self._extract_link(proxy)
+        except IMAPLoginError as error:
+            # Credentials were changed after the cached validation, check them again on the next login
+            imap_server, email, _ = self._imap_credentials()
+            await EmailValidations.invalidate(imap_server, email)
+            logger.error(f"Account: {self.account_data.email} | Email is invalid: {error}")
+            return None
+
         if not confirm_url["status"]:
             return None
 
@@ -157,25 +177,36 @@ class Bot:
 
         async def handle_turnistale() -> Optional[str]:
             logger.info(f"Account: {email} | Solving Hcaptcha captcha | Attempt: {attempt + 1}/{max_attempts}")
+            metrics.increment("captcha.attempts")
+
+            async with captcha_limiter.acquire() as waited:
+                if waited >= 1:
+                    logger.info(f"Account: {email} | Waited {waited:.1f}s for a free captcha slot")
+
+                success, result = await captcha_solver.solve(
+                    website_url="https://auth.privy.io",
+                    website_key="b9fc5a50-2e5c-457a-9582-80ce342c2534",
+                )
 
-            success, result = await captcha_solver.solve(
-                website_url="https://auth.privy.io",
-                website_key="b9fc5a50-2e5c-457a-9582-80ce342c2534",
-            )
             if success:
                 logger.success(f"Account: {email} | Hcaptcha captcha solved")
                 return result
 
             raise ValueError(f"{result}")
 
+        started = time.monotonic()
         for attempt in range(max_attempts):
             try:
-                return await handle_turnistale()
+                token = await handle_turnistale()
+                metrics.increment("captcha.tokens")
+                metrics.observe("captcha.token_seconds", time.monotonic() - started)
+                return token
             except Exception as e:
                 logger.error(
                     f"Account: {email} | Error occurred while solving Hcaptcha: {str(e)} | Retrying..."
                 )
                 if attempt == max_attempts - 1:
+                    metrics.increment("captcha.token_failures")
                     raise CaptchaSolvingFailed(f"Failed to solve Hcaptcha captcha after {max_attempts} attempts")
 
     async def get_invite_code(self) -> Optional[str]:
@@ -232,7 +263,7 @@ class Bot:
                 await api.init_auth(self.account_data.email, captcha_token)
                 logger.success(f"Account: {self.account_data.email} | Authentication initiated, confirmation code sent to email")
 
-                code = await self._get_confirmation_code()
+                code = await self._get_confirmation_code(proxy=proxy)
                 if not code:
                     return operation_failed(self.account_data.email, self.account_data.email_password)
 
@@ -287,6 +318,7 @@ class Bot:
                     proxy=proxy
                 )
 
+                metrics.increment("login.success")
                 logger.success(f"Account: {self.account_data.email} | Account logged in | Session saved to database")
                 return operation_success(self.account_data.email, self.account_data.email_password)
 
@@ -303,7 +335,7 @@ class Bot:
 
                 elif error.error_type == APIErrorType.TOO_MANY_USERS_FROM_THIS_IP:
                     logger.error(f"Account: {self.account_data.email} | Too many users from this IP | Proxy banned | Changing proxy and retrying..")
-                    await self._update_account_proxy(db_account_value, attempt, max_attempts)
+                    await self._update_account_proxy(db_account_value, attempt, max_attempts, ip_limited=True)
                     continue
 
                 elif error.error_type == APIErrorType.TOO_MANY_REQUESTS:
@@ -401,7 +433,7 @@ class Bot:
 
                 elif error.error_type == APIErrorType.TOO_MANY_USERS_FROM_THIS_IP:
                     logger.error(f"Account: {self.account_data.email} | Too many users from this IP | Proxy banned | Changing proxy and retrying..")
-                    await self._update_account_proxy(db_account_value, attempt, max_attempts)
+                    await self._update_account_proxy(db_account_value, attempt, max_attempts, ip_limited=True)
                     continue
 
                 logger.error(f"Account: {self.account_data.email} | Error occurred during stats retrieval (APIError): {error} | Skipped permanently")
@@ -511,6 +543,11 @@ class Bot:
             db_account_value, api = None, None
 
             try:
+                # Sleeping accounts are skipped before their tokens are loaded
+                sleep_until = await Accounts.get_sleep_until(self.account_data.email)
+                if sleep_until and await handle_sleep(sleep_until):
+                    return
+
                 db_account_value = await Accounts.get_account(email=self.account_data.email)
                 if not db_account_value or not all([
                     db_account_value.extension_token,
@@ -521,6 +558,12 @@ class Bot:
                     await self.handle_invalid_account(self.account_data.email, self.account_data.email_password, "unlogged")
                     return None
 
+                if db_account_value.active_account_proxy and proxy_manager.is_draining(db_account_value.active_account_proxy):
+                    await proxy_manager.release_proxy(db_account_value.active_account_proxy, owner=self.account_data.email)
+                    proxy = await proxy_manager.get_proxy(owner=self.account_data.email)
+                    await db_account_value.update_account_proxy(proxy_table.url(proxy))
+                    logger.info(f"Account: {self.account_data.email} | Proxy was removed from proxies.txt | Moved to another proxy")
+
                 api = DawnExtensionAPI(
                     privy_auth_token=db_account_value.privy_auth_token,
                     extension_token=db_account_value.extension_token,
@@ -528,11 +571,6 @@ class Bot:
                     proxy=db_account_value.active_account_proxy
                 )
 
-                if db_account_value.sleep_until:
-                    sleep_duration = await handle_sleep(db_account_value.sleep_until)
-                    if sleep_duration:
-                        return
-
                 logger.info(f"Account: {self.account_data.email} | Sending ping..")
                 await api.extension_ping(user_id=db_account_value.user_id)
                 logger.success(f"Account: {self.account_data.email} | Ping sent")
@@ -547,7 +585,7 @@ class Bot:
 
                 if error.error_type == APIErrorType.TOO_MANY_USERS_FROM_THIS_IP:
                     logger.error(f"Account: {self.account_data.email} | Too many users from this IP | Proxy banned | Changing proxy and retrying..")
-                    await self._update_account_proxy(db_account_value, attempt, max_attempts)
+                    await self._update_account_proxy(db_account_value, attempt, max_attempts, ip_limited=True)
                     continue
 
                 elif error.error_type in (APIErrorType.INVALID_TOKEN, APIErrorType.PING_INTERVAL_VIOLATION, APIErrorType.CUSTOM_DOMAIN_VIOLATION):
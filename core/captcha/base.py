@@ -1,7 +1,37 @@
 import asyncio
+import time
 import httpx
 
-from typing import Optional
+from typing import Optional, Tuple, Union
+
+from utils.processing.metrics import metrics
+
+
+def captcha_failure_reason(error: str) -> str:
+    error = str(error).lower()
+
+    if "timeout" in error or "timed out" in error:
+        return "timeout"
+    elif "http error" in error:
+        return "http_error"
+    elif "max attempts" in error or "max time" in error:
+        return "not_ready"
+    elif "unexpected" in error:
+        return "unexpected"
+
+    return "provider_error"
+
+
+def record_captcha_solve(started: float, success: bool, result: Optional[str]) -> None:
+    elapsed = time.monotonic() - started
+    metrics.increment("captcha.solves")
+
+    if success:
+        metrics.increment("captcha.solves.success")
+        metrics.observe("captcha.solve_seconds", elapsed)
+    else:
+        metrics.increment(f"captcha.failures.{captcha_failure_reason(result)}")
+        metrics.observe("captcha.failed_solve_seconds", elapsed)
 
 
 class CaptchaSolverBase:
@@ -20,6 +50,12 @@ class CaptchaSolverBase:
         self.client = httpx.AsyncClient(timeout=10, verify=False)
 
     async def solve_cloudflare(self, site_key: str, page_url: str) -> tuple[bool, Optional[str]] | tuple[bool, str]:
+        started = time.monotonic()
+        success, result = await self._solve_cloudflare(site_key, page_url)
+        record_captcha_solve(started, success, result)
+        return success, result
+
+    async def _solve_cloudflare(self, site_key: str, page_url: str) -> tuple[bool, Optional[str]] | tuple[bool, str]:
         captcha_type = "TurnstileTaskProxyless"
         if self.base_url == "https://api.capsolver.com":
             captcha_type = "AntiTurnstileTaskProxyLess"
@@ -76,6 +112,23 @@ class CaptchaSolverBase:
 
         return False, "Max time for solving exhausted"
 
+    async def get_balance(self) -> Tuple[bool, Union[float, str]]:
+        try:
+            resp = await self.client.post(f"{self.base_url}/getBalance", json={"clientKey": self.api_key})
+            resp.raise_for_status()
+            data = resp.json()
+
+            if data.get("errorId") == 0 and "balance" in data:
+                return True, float(data["balance"])
+            return False, data.get("errorDescription", "Unknown error")
+
+        except httpx.HTTPStatusError as err:
+            return False, f"HTTP error: {err}"
+        except httpx.TimeoutException:
+            return False, "Request timed out"
+        except Exception as err:
+            return False, f"Unexpected error: {err}"
+
 
 class AntiCaptchaSolver(CaptchaSolverBase):
     def __init__(self, api_key: str, base_url: str, max_attempts: int = 10):
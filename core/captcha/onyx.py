@@ -1,8 +1,11 @@
 import asyncio
+import time
 from typing import Any, Optional, Tuple, Union
 
 import httpx
 
+from .base import record_captcha_solve
+
 
 class OnyxCaptchaSolver:
     def __init__(
@@ -147,6 +150,18 @@ class OnyxCaptchaSolver:
         website_key: str,
         rqdata: Optional[str] = None,
         task_proxy: Optional[str] = None,
+    ) -> Tuple[bool, str]:
+        started = time.monotonic()
+        success, result = await self._solve(website_url, website_key, rqdata, task_proxy)
+        record_captcha_solve(started, success, result)
+        return success, result
+
+    async def _solve(
+        self,
+        website_url: str,
+        website_key: str,
+        rqdata: Optional[str] = None,
+        task_proxy: Optional[str] = None,
     ) -> Tuple[bool, str]:
         success, created = await self.create_task(
             website_url=website_url,
@@ -1,2 +1,2 @@
-from .models import Accounts
-from .settings import initialize_database
+from .models import Accounts, EmailValidations, UsedCodes, SchemaMigrations
+from .settings import initialize_database, close_database
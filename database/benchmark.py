@@ -0,0 +1,64 @@
+"""Compares the SQLite profile with Tortoise defaults on a temporary database: python -m database.benchmark [accounts] [writes]"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import pytz
+
+from datetime import datetime, timedelta
+from tortoise import Tortoise
+from tortoise.backends.base.config_generator import expand_db_url
+
+from database.models import Accounts
+from database.settings import MODELS, _connection_config
+from database.writer import write_queue
+
+
+async def _run(db_url: str, tuned: bool, accounts: int, writes: int) -> float:
+    connection = expand_db_url(db_url)
+    if tuned:
+        connection["credentials"].update(
+            {key: value for key, value in _connection_config()["credentials"].items() if key != "file_path"}
+        )
+
+    await Tortoise.init(
+        config={
+            "connections": {"default": connection},
+            "apps": {"models": {"models": MODELS, "default_connection": "default"}},
+        },
+        timezone="UTC",
+    )
+    await Tortoise.generate_schemas(safe=True)
+    if tuned:
+        write_queue.start()
+
+    async def account_worker(index: int) -> None:
+        account = await Accounts.create_or_update_account(email=f"bench{index}@example.com", proxy=f"http://127.0.0.1:{index}")
+        for attempt in range(writes):
+            await account.set_sleep_until(datetime.now(pytz.UTC) + timedelta(seconds=attempt))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(account_worker(index) for index in range(accounts)))
+    elapsed = time.perf_counter() - started
+
+    await write_queue.close()
+    await Tortoise.close_connections()
+    return elapsed
+
+
+async def main() -> None:
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, tuned in (("default", False), ("tuned", True)):
+            db_url = f"sqlite://{os.path.join(directory, name + '.sqlite3')}"
+            elapsed = await _run(db_url, tuned, accounts, writes)
+            total = accounts * (writes + 1)
+            print(f"{name:>8}: {total} writes in {elapsed:.2f}s | {total / elapsed:.0f} writes/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
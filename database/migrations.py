@@ -0,0 +1,37 @@
+from typing import Awaitable, Callable
+from loguru import logger
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from .models import SchemaMigrations
+
+
+async def _add_accounts_indexes(connection: BaseDBAsyncClient) -> None:
+    # Same names as generate_schemas gives the index=True fields, so a new database gets no duplicates
+    await connection.execute_script(
+        'CREATE INDEX IF NOT EXISTS "idx_dawn_accoun_sleep_u_5c5d54" ON "dawn_accounts" ("sleep_until");'
+    )
+    await connection.execute_script(
+        'CREATE INDEX IF NOT EXISTS "idx_dawn_accoun_active__8ee65e" ON "dawn_accounts" ("active_account_proxy");'
+    )
+
+
+# Append only: (version, name, migration). generate_schemas(safe=True) creates missing tables but never
+# changes existing ones, these bring databases created by older versions up to date.
+MIGRATIONS: list[tuple[int, str, Callable[[BaseDBAsyncClient], Awaitable[None]]]] = [
+    (1, "Index dawn_accounts.sleep_until and dawn_accounts.active_account_proxy", _add_accounts_indexes),
+]
+
+
+async def run_migrations() -> None:
+    applied = await SchemaMigrations.get_applied()
+
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+
+        async with in_transaction() as connection:
+            await migrate(connection)
+            await SchemaMigrations.create(version=version, name=name, using_db=connection)
+
+        logger.info(f"Database migrated to version {version}: {name}")
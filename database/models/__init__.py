@@ -1 +1,4 @@
 from .accounts import Accounts
+from .email_validations import EmailValidations
+from .used_codes import UsedCodes
+from .schema_migrations import SchemaMigrations
@@ -1,11 +1,15 @@
 import asyncio
 import random
+import time
 
 import pytz
 
 from datetime import datetime
 from tortoise import Model, fields
 from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from database.writer import queued_write
 
 
 class Accounts(Model):
@@ -20,8 +24,8 @@ class Accounts(Model):
     extension_token = fields.CharField(max_length=2048, null=True)
     refresh_token = fields.CharField(max_length=1024, null=True)
 
-    active_account_proxy = fields.CharField(max_length=255, null=True)
-    sleep_until = fields.DatetimeField(null=True)
+    active_account_proxy = fields.CharField(max_length=255, null=True, index=True)
+    sleep_until = fields.DatetimeField(null=True, index=True)
 
     class Meta:
         table = "dawn_accounts"
@@ -36,41 +40,92 @@ class Accounts(Model):
     async def get_accounts(cls):
         return await cls.all()
 
+    @classmethod
+    async def get_field(cls, email: str, field: str):
+        """Reads one column of an account without loading the token columns"""
+        return await cls.filter(email=email).first().values_list(field, flat=True)
+
+    @classmethod
+    async def get_sleep_until(cls, email: str) -> datetime | None:
+        return await cls.get_field(email, "sleep_until")
+
     @classmethod
     async def get_accounts_stats(cls, emails: list[str] | None = None) -> tuple[int, int]:
         query = cls.all()
         if emails:
             query = query.filter(email__in=emails)
 
-        accounts = await query
+        # Counted by the database on the sleep_until index instead of loading every account
         now = datetime.now(pytz.UTC)
-
-        accounts_with_expired_sleep = len([
-            a for a in accounts
-            if (a.sleep_until is None) or (a.sleep_until <= now)
-        ])
-
-        accounts_waiting_sleep = len([
-            a for a in accounts
-            if a.sleep_until and a.sleep_until > now
-        ])
+        accounts_with_expired_sleep = await query.filter(Q(sleep_until__isnull=True) | Q(sleep_until__lte=now)).count()
+        accounts_waiting_sleep = await query.filter(sleep_until__gt=now).count()
 
         return accounts_with_expired_sleep, accounts_waiting_sleep
 
     # ===== Proxy helpers =====
 
+    @queued_write
     async def update_account_proxy(self, proxy: str | None):
         self.active_account_proxy = proxy
         await self.save(update_fields=["active_account_proxy"])
 
+    @classmethod
+    async def get_proxy_assignments(cls) -> dict[str, str]:
+        rows = await cls.filter(active_account_proxy__isnull=False).values_list("email", "active_account_proxy")
+        return dict(rows)
+
     @classmethod
     async def get_account_proxy(cls, email: str) -> str:
-        account = await cls.get_account(email=email)
-        return account.active_account_proxy if account and account.active_account_proxy else ""
+        return await cls.get_field(email, "active_account_proxy") or ""
 
     # ===== Create / update =====
 
+    # Column written for each keyword of create_or_update_account
+    UPSERT_COLUMNS = {
+        "email_password": "email_password",
+        "user_id": "user_id",
+        "referral_code": "referral_code",
+        "session_token": "session_token",
+        "privy_auth_token": "privy_auth_token",
+        "extension_token": "extension_token",
+        "refresh_token": "refresh_token",
+        "proxy": "active_account_proxy",
+    }
+
+    @classmethod
+    def _upsert_sql(cls, dialect: str, columns: list[str], updates: list[str], rows: int) -> str:
+        width = len(columns)
+        if dialect == "postgres":
+            placeholders = [
+                "(" + ", ".join(f"${row * width + index + 1}" for index in range(width)) + ")"
+                for row in range(rows)
+            ]
+        else:
+            placeholders = ["(" + ", ".join("?" * width) + ")"] * rows
+
+        conflict = (
+            "DO UPDATE SET " + ", ".join(f'"{column}" = excluded."{column}"' for column in updates)
+            if updates else "DO NOTHING"
+        )
+        return (
+            f'INSERT INTO "{cls._meta.db_table}" (' + ", ".join(f'"{column}"' for column in columns) + ") "
+            f"VALUES {', '.join(placeholders)} "
+            f'ON CONFLICT ("email") {conflict}'
+        )
+
     @classmethod
+    def _upsert_columns(cls, payload: dict) -> tuple[list[str], list]:
+        # Like the old get-then-save path, only values that are not None overwrite an existing row
+        columns, values = ["email"], [payload["email"]]
+        for key, column in cls.UPSERT_COLUMNS.items():
+            if payload.get(key) is not None:
+                columns.append(column)
+                values.append(payload[key])
+
+        return columns, values
+
+    @classmethod
+    @queued_write
     async def create_or_update_account(
         cls,
         email: str,
@@ -83,55 +138,61 @@ class Accounts(Model):
         refresh_token: str | None = None,
         proxy: str | None = None,
     ) -> "Accounts":
-        account = await cls.get_account(email=email)
+        """Inserts or updates the account with a single INSERT .. ON CONFLICT (email) statement"""
+        columns, values = cls._upsert_columns({
+            "email": email,
+            "email_password": email_password,
+            "user_id": user_id,
+            "referral_code": referral_code,
+            "session_token": session_token,
+            "privy_auth_token": privy_auth_token,
+            "extension_token": extension_token,
+            "refresh_token": refresh_token,
+            "proxy": proxy,
+        })
+        connection = cls._meta.db
+        sql = cls._upsert_sql(connection.capabilities.dialect, columns, columns[1:], 1)
+
+        if len(columns) == 1:
+            # Nothing to update, DO NOTHING returns no row for an existing account
+            await connection.execute_query(sql, values)
+            return await cls.get(email=email)
+
+        _, rows = await connection.execute_query(sql + " RETURNING *", values)
+        cls._add_referral_code(referral_code)
+        return cls._init_from_db(**dict(rows[0]))
 
-        if account is None:
-            account = await cls.create(
-                email=email,
-                email_password=email_password,
-                user_id=user_id,
-                referral_code=referral_code,
-                session_token=session_token,
-                privy_auth_token=privy_auth_token,
-                extension_token=extension_token,
-                refresh_token=refresh_token,
-                active_account_proxy=proxy,
+    @classmethod
+    @queued_write
+    async def bulk_create_or_update_accounts(cls, payloads: list[dict], batch_size: int = 500) -> int:
+        """Upserts many accounts, payloads take the keywords of create_or_update_account. Returns the number of accounts written"""
+        merged: dict[str, dict] = {}
+        for payload in payloads:
+            # One statement may not touch the same row twice, later payloads win
+            merged.setdefault(payload["email"], {}).update(
+                {key: value for key, value in payload.items() if value is not None}
             )
-            return account
-
-        # update existing
-        update_fields: list[str] = []
-
-        if email_password is not None:
-            account.email_password = email_password
-            update_fields.append("email_password")
-        if user_id is not None:
-            account.user_id = user_id
-            update_fields.append("user_id")
-        if referral_code is not None:
-            account.referral_code = referral_code
-            update_fields.append("referral_code")
-        if session_token is not None:
-            account.session_token = session_token
-            update_fields.append("session_token")
-        if privy_auth_token is not None:
-            account.privy_auth_token = privy_auth_token
-            update_fields.append("privy_auth_token")
-        if extension_token is not None:
-            account.extension_token = extension_token
-            update_fields.append("extension_token")
-        if refresh_token is not None:
-            account.refresh_token = refresh_token
-            update_fields.append("refresh_token")
-        if proxy is not None:
-            account.active_account_proxy = proxy
-            update_fields.append("active_account_proxy")
-
-        if update_fields:
-            await account.save(update_fields=update_fields)
-
-        return account
 
+        groups: dict[tuple[str, ...], list[list]] = {}
+        for payload in merged.values():
+            columns, values = cls._upsert_columns(payload)
+            groups.setdefault(tuple(columns), []).append(values)
+
+        dialect = cls._meta.db.capabilities.dialect
+        async with in_transaction() as connection:
+            for columns, rows in groups.items():
+                # Stays below the bound parameter limit of older SQLite builds
+                step = max(1, min(batch_size, 999 // len(columns)))
+                for start in range(0, len(rows), step):
+                    chunk = rows[start:start + step]
+                    sql = cls._upsert_sql(dialect, list(columns), list(columns[1:]), len(chunk))
+                    await connection.execute_query(sql, [value for row in chunk for value in row])
+
+        for payload in merged.values():
+            cls._add_referral_code(payload.get("referral_code"))
+        return len(merged)
+
+    @queued_write
     async def update_account(
         self,
         email_password: str | None = None,
@@ -172,6 +233,7 @@ class Accounts(Model):
 
         if update_fields:
             await self.save(update_fields=update_fields)
+            self._add_referral_code(referral_code)
 
         return self
 
@@ -179,45 +241,70 @@ class Accounts(Model):
 
     @classmethod
     async def get_user_id(cls, email: str) -> str | None:
-        acc = await cls.get_account(email=email)
-        return acc.user_id if acc else None
+        return await cls.get_field(email, "user_id")
 
     @classmethod
     async def get_referral_code(cls, email: str) -> str | None:
-        acc = await cls.get_account(email=email)
-        return acc.referral_code if acc else None
+        return await cls.get_field(email, "referral_code")
 
     @classmethod
     async def get_session_token(cls, email: str) -> str | None:
-        acc = await cls.get_account(email=email)
-        return acc.session_token if acc else None
+        return await cls.get_field(email, "session_token")
 
     @classmethod
     async def get_privy_auth_token(cls, email: str) -> str | None:
-        acc = await cls.get_account(email=email)
-        return acc.privy_auth_token if acc else None
+        return await cls.get_field(email, "privy_auth_token")
 
     @classmethod
     async def get_extension_token(cls, email: str) -> str | None:
-        acc = await cls.get_account(email=email)
-        return acc.extension_token if acc else None
+        return await cls.get_field(email, "extension_token")
 
     @classmethod
     async def get_refresh_token(cls, email: str) -> str | None:
-        acc = await cls.get_account(email=email)
-        return acc.refresh_token if acc else None
+        return await cls.get_field(email, "refresh_token")
+
+    # Referral codes of all accounts, loaded once per REFERRAL_POOL_TTL seconds and extended as accounts log in
+    REFERRAL_POOL_TTL = 600
+    _referral_pool: list[str] = []
+    _referral_pool_codes: set[str] = set()
+    _referral_pool_loaded_at: float | None = None
+    _referral_pool_lock = asyncio.Lock()
+
+    @classmethod
+    def _add_referral_code(cls, code: str | None) -> None:
+        if code and code not in cls._referral_pool_codes:
+            cls._referral_pool_codes.add(code)
+            cls._referral_pool.append(code)
+
+    @classmethod
+    def _referral_pool_expired(cls) -> bool:
+        loaded_at = cls._referral_pool_loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > cls.REFERRAL_POOL_TTL
+
+    @classmethod
+    async def _refresh_referral_pool(cls) -> None:
+        async with cls._referral_pool_lock:
+            if not cls._referral_pool_expired():
+                return
+
+            invite_codes = await cls.filter(~Q(referral_code=None)).values_list(
+                "referral_code", flat=True
+            )
+            cls._referral_pool = list(dict.fromkeys(c for c in invite_codes if c))
+            cls._referral_pool_codes = set(cls._referral_pool)
+            cls._referral_pool_loaded_at = time.monotonic()
 
     @classmethod
     async def get_random_referral_code(cls) -> str | None:
-        invite_codes = await cls.filter(~Q(referral_code=None)).values_list(
-            "referral_code", flat=True
-        )
-        invite_codes = [c for c in invite_codes if c]
-        return random.choice(invite_codes) if invite_codes else None
+        if cls._referral_pool_expired():
+            await cls._refresh_referral_pool()
+
+        return random.choice(cls._referral_pool) if cls._referral_pool else None
 
     # ===== Delete =====
 
     @classmethod
+    @queued_write
     async def delete_account(cls, email: str) -> bool:
         account = await cls.get_account(email=email)
         if account is None:
@@ -227,6 +314,7 @@ class Accounts(Model):
 
     # ===== Sleep helpers =====
 
+    @queued_write
     async def set_sleep_until(self, sleep_until: datetime) -> "Accounts":
         if not isinstance(sleep_until, datetime):
             raise ValueError("sleep_until must be a datetime object")
@@ -243,6 +331,7 @@ class Accounts(Model):
     # ===== Bulk ops =====
 
     @classmethod
+    @queued_write
     async def clear_all_accounts_proxies(cls) -> int:
         affected = await cls.all().update(active_account_proxy=None)
         return affected
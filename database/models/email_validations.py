@@ -0,0 +1,52 @@
+import hashlib
+import pytz
+
+from datetime import datetime, timedelta
+from tortoise import Model, fields
+
+from database.writer import queued_write
+
+
+class EmailValidations(Model):
+    server = fields.CharField(max_length=255)
+    email = fields.CharField(max_length=255)
+    password_hash = fields.CharField(max_length=64)
+    validated_at = fields.DatetimeField()
+
+    class Meta:
+        table = "dawn_email_validations"
+        unique_together = (("server", "email"),)
+
+    @staticmethod
+    def _hash_password(password: str | None) -> str:
+        # Only a digest is stored, it is compared so that a changed password is validated again
+        return hashlib.sha256((password or "").encode()).hexdigest()
+
+    @classmethod
+    async def is_valid(cls, server: str, email: str, password: str | None, ttl: int) -> bool:
+        if ttl <= 0:
+            return False
+
+        return await cls.filter(
+            server=server.lower(),
+            email=email.lower(),
+            password_hash=cls._hash_password(password),
+            validated_at__gte=datetime.now(pytz.UTC) - timedelta(seconds=ttl),
+        ).exists()
+
+    @classmethod
+    @queued_write
+    async def mark_valid(cls, server: str, email: str, password: str | None) -> None:
+        await cls.update_or_create(
+            server=server.lower(),
+            email=email.lower(),
+            defaults={
+                "password_hash": cls._hash_password(password),
+                "validated_at": datetime.now(pytz.UTC),
+            },
+        )
+
+    @classmethod
+    @queued_write
+    async def invalidate(cls, server: str, email: str) -> None:
+        await cls.filter(server=server.lower(), email=email.lower()).delete()
@@ -0,0 +1,14 @@
+from tortoise import Model, fields
+
+
+class SchemaMigrations(Model):
+    version = fields.IntField(pk=True)
+    name = fields.CharField(max_length=255)
+    applied_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "dawn_schema_migrations"
+
+    @classmethod
+    async def get_applied(cls) -> set[int]:
+        return set(await cls.all().values_list("version", flat=True))
@@ -0,0 +1,38 @@
+import pytz
+
+from datetime import datetime, timedelta
+from tortoise import Model, fields
+
+from database.writer import queued_write
+
+
+class UsedCodes(Model):
+    mailbox = fields.CharField(max_length=255)
+    code = fields.CharField(max_length=32)
+    message_id = fields.CharField(max_length=998, default="")
+    claimed_at = fields.DatetimeField()
+
+    class Meta:
+        table = "dawn_used_codes"
+        unique_together = (("mailbox", "code", "message_id"),)
+
+    @classmethod
+    async def get_recent(cls, ttl: int) -> list[tuple[tuple[str, str, str], float]]:
+        since = datetime.now(pytz.UTC) - timedelta(seconds=ttl)
+        rows = await cls.filter(claimed_at__gte=since).values_list("mailbox", "code", "message_id", "claimed_at")
+        return [((mailbox, code, message_id), claimed_at.timestamp()) for mailbox, code, message_id, claimed_at in rows]
+
+    @classmethod
+    @queued_write
+    async def add(cls, mailbox: str, code: str, message_id: str, claimed_at: float) -> None:
+        await cls.get_or_create(
+            mailbox=mailbox,
+            code=code,
+            message_id=message_id,
+            defaults={"claimed_at": datetime.fromtimestamp(claimed_at, pytz.UTC)},
+        )
+
+    @classmethod
+    @queued_write
+    async def purge(cls, ttl: int) -> int:
+        return await cls.filter(claimed_at__lt=datetime.now(pytz.UTC) - timedelta(seconds=ttl)).delete()
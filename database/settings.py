@@ -1,17 +1,59 @@
 from loguru import logger
 from tortoise import Tortoise
+from tortoise.backends.base.config_generator import expand_db_url
 from loader import config
+from .writer import write_queue
+from .migrations import run_migrations
+
+
+MODELS = [
+    "database.models.accounts",
+    "database.models.email_validations",
+    "database.models.used_codes",
+    "database.models.schema_migrations",
+]
+
+
+def _connection_config() -> dict:
+    connection = expand_db_url(config.application_settings.database_url)
+    settings = config.database_settings
+
+    if "sqlite" in connection["engine"] and settings.sqlite_tuning:
+        # Pragmas given in database_url win over the profile
+        for pragma, value in {
+            "journal_mode": "WAL",
+            "synchronous": settings.synchronous,
+            "mmap_size": settings.mmap_size,
+            "cache_size": settings.cache_size,
+            "temp_store": "MEMORY",
+        }.items():
+            connection["credentials"].setdefault(pragma, value)
+
+    return connection
 
 
 async def initialize_database() -> None:
     try:
+        connection = _connection_config()
         await Tortoise.init(
-            db_url=config.application_settings.database_url,
-            modules={"models": ["database.models.accounts"]},
+            config={
+                "connections": {"default": connection},
+                "apps": {"models": {"models": MODELS, "default_connection": "default"}},
+            },
             timezone="UTC",
         )
         await Tortoise.generate_schemas(safe=True)
+        await run_migrations()
+
+        if "sqlite" in connection["engine"] and config.database_settings.sqlite_tuning:
+            write_queue.start(config.database_settings.write_batch_size)
 
     except Exception as error:
         logger.error(f"Error while initializing database: {error}")
         exit(0)
+
+
+async def close_database() -> None:
+    """Drains the write queue before closing the connections"""
+    await write_queue.close()
+    await Tortoise.close_connections()
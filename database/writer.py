@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from tortoise.transactions import in_transaction
+
+from utils.processing.metrics import metrics
+
+
+T = TypeVar("T")
+_inside_writer: ContextVar[bool] = ContextVar("inside_writer", default=False)
+
+
+class WriteQueue:
+    """Runs database writes one after another in a single task, grouped into transactions."""
+
+    def __init__(self, batch_size: int = 200):
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self, batch_size: Optional[int] = None) -> None:
+        if batch_size:
+            self.batch_size = batch_size
+        if not self.running:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._process())
+
+    async def close(self) -> None:
+        """Waits for queued writes and stops the writer task"""
+        if not self.running:
+            return
+
+        await self._queue.join()
+        self._worker.cancel()
+        self._worker = None
+
+    async def run(self, operation: Callable[[], Awaitable[T]]) -> T:
+        # Writes issued by a queued write are already inside the batch transaction
+        if not self.running or _inside_writer.get():
+            return await operation()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future))
+        return await future
+
+    async def _process(self) -> None:
+        _inside_writer.set(True)
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            started = time.monotonic()
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            metrics.observe("db.write_batch_size", len(batch))
+            metrics.observe("db.write_batch_seconds", time.monotonic() - started)
+
+    @staticmethod
+    async def _commit(batch: list[tuple[Callable[[], Awaitable[Any]], asyncio.Future]]) -> None:
+        results = []
+        try:
+            async with in_transaction():
+                for operation, future in batch:
+                    if future.done():
+                        continue
+
+                    try:
+                        async with in_transaction():
+                            results.append((future, await operation()))
+                    except Exception as error:
+                        if not future.done():
+                            future.set_exception(error)
+
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for future, result in results:
+            if not future.done():
+                future.set_result(result)
+
+
+write_queue = WriteQueue()
+
+
+def queued_write(method: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Sends a model method through the write queue"""
+    @wraps(method)
+    async def wrapper(*args, **kwargs) -> T:
+        return await write_queue.run(lambda: method(*args, **kwargs))
+
+    return wrapper
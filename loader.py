@@ -1,14 +1,56 @@
 import asyncio
 
-from utils import load_config, FileOperations, ProxyManager
+from utils import load_config, FileOperations, ProxyManager, proxy_health, ConcurrencyLimiter, IMAPConnectionPool, IMAPHostGovernor, RedirectCodeDispatcher, FolderDirectory, MailParser
 from core.captcha import TwoCaptchaSolver, AntiCaptchaSolver, CapsolverSolver, OnyxCaptchaSolver
 
 config = load_config()
 file_operations = FileOperations()
 semaphore = asyncio.Semaphore(config.application_settings.threads)
-proxy_manager = ProxyManager(check_uniqueness=config.application_settings.check_uniqueness_of_proxies)
+proxy_manager = ProxyManager(
+    check_uniqueness=config.application_settings.check_uniqueness_of_proxies,
+    health=proxy_health,
+    wait_timeout=config.application_settings.proxy_wait_timeout,
+    accounts_per_proxy=config.application_settings.accounts_per_proxy,
+    affinity=config.application_settings.proxy_affinity,
+    subnet_capacity=config.application_settings.proxy_subnet_capacity,
+)
 
 captcha_solver = OnyxCaptchaSolver(
     api_key=config.captcha_settings.onyx_api_key,
     max_attempts=config.captcha_settings.max_captcha_solving_time // 3,
 )
+
+captcha_limiter = ConcurrencyLimiter(
+    name="captcha",
+    max_concurrent=config.captcha_settings.max_concurrent_solves,
+    rate_per_minute=config.captcha_settings.max_solves_per_minute,
+)
+
+imap_governor = IMAPHostGovernor(
+    limits=config.imap_settings.server_limits.per_server,
+    max_connections=config.imap_settings.server_limits.max_connections,
+    logins_per_minute=config.imap_settings.server_limits.logins_per_minute,
+)
+
+imap_pool = IMAPConnectionPool(
+    max_connections_per_mailbox=config.imap_settings.connection_pool.max_connections_per_mailbox,
+    idle_timeout=config.imap_settings.connection_pool.idle_timeout,
+    keepalive_interval=config.imap_settings.connection_pool.keepalive_interval,
+    governor=imap_governor,
+)
+
+imap_folders = FolderDirectory(
+    ttl=config.imap_settings.folders.cache_ttl,
+    allowed_folders=config.imap_settings.folders.allowed,
+)
+
+mail_parser = MailParser(workers=config.imap_settings.parser_workers)
+
+redirect_dispatcher = RedirectCodeDispatcher(
+    imap_server=config.redirect_settings.imap_server,
+    email=config.redirect_settings.email,
+    password=config.redirect_settings.password,
+    pool=imap_pool,
+    folders=imap_folders,
+    parser=mail_parser,
+) if config.redirect_settings.enabled else None
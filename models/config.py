@@ -2,7 +2,7 @@ import secrets
 import string
 import random
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pydantic import BaseModel, PositiveInt, ConfigDict, Field
 
 
@@ -51,10 +51,35 @@ class IMAPSettings:
         enable: bool
         imap_server: str = ""
 
+    @dataclass
+    class Folders:
+        cache_ttl: int = 3600
+        allowed: list[str] = field(default_factory=list)
+
+    @dataclass
+    class ConnectionPool:
+        max_connections_per_mailbox: PositiveInt = 2
+        idle_timeout: int = 300
+        keepalive_interval: PositiveInt = 60
+
+    @dataclass
+    class ServerLimits:
+        max_connections: PositiveInt = 20
+        logins_per_minute: int = 60
+        per_server: dict[str, dict[str, int]] = field(default_factory=dict)
+
     use_single_imap: UseSingleImap
     use_proxy_for_imap: bool
 
     servers: dict[str, str]
+    connection_pool: ConnectionPool = field(default_factory=ConnectionPool)
+    folders: Folders = field(default_factory=Folders)
+    server_limits: ServerLimits = field(default_factory=ServerLimits)
+    use_idle: bool = True
+    idle_rescan_interval: PositiveInt = 15
+    validation_cache_ttl: int = 21600
+    persist_used_codes: bool = True
+    parser_workers: int = 0
 
 
 @dataclass
@@ -67,12 +92,37 @@ class ApplicationSettings:
     check_uniqueness_of_proxies: bool
     disable_auto_proxy_change: bool
     use_random_ref_codes_from_db: bool
+    proxy_wait_timeout: PositiveInt = 300
+    accounts_per_proxy: int = 0
+    proxy_affinity: bool = False
+    proxy_subnet_capacity: bool = False
+    hot_reload_interval: int = 10
 
 
 @dataclass
 class CaptchaSettings:
     onyx_api_key: str = ""
     max_captcha_solving_time: PositiveInt = 180
+    max_concurrent_solves: PositiveInt = 10
+    max_solves_per_minute: int = 0
+
+
+@dataclass
+class ProxyCheckSettings:
+    enabled: bool = False
+    concurrency: PositiveInt = 1000
+    timeout: PositiveInt = 5
+    cache_ttl: int = 3600
+    cache_file: str = "./results/proxy_check.json"
+
+
+@dataclass
+class DatabaseSettings:
+    sqlite_tuning: bool = True
+    synchronous: str = "NORMAL"
+    mmap_size: int = 268435456
+    cache_size: int = -65536
+    write_batch_size: PositiveInt = 200
 
 
 class Config(BaseConfig):
@@ -89,5 +139,7 @@ class Config(BaseConfig):
     redirect_settings: RedirectConfig
     imap_settings: IMAPSettings
     captcha_settings: CaptchaSettings
+    proxy_check_settings: ProxyCheckSettings = Field(default_factory=ProxyCheckSettings)
+    database_settings: DatabaseSettings = Field(default_factory=DatabaseSettings)
 
     module: str = ""
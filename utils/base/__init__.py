@@ -1,2 +1,3 @@
 from .file_utils import *
-from .load_config import load_config
+from .load_config import load_config, ConfigLoader
+from .file_watcher import LineFileWatcher, LinesDiff
@@ -0,0 +1,80 @@
+import hashlib
+import os
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+
+@dataclass
+class LinesDiff:
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+class LineFileWatcher:
+    """Polls a line-based file (mtime and size) and reports which lines were added or removed."""
+
+    TAIL_CHECK_SIZE = 4096
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lines: set[str] = set()
+        self._stat: Optional[tuple[int, int]] = None
+        self._tail_digest = b""
+        self._ends_with_newline = True
+
+    @staticmethod
+    def _split(content: bytes) -> list[str]:
+        return [line.strip() for line in content.decode("utf-8", "replace").splitlines() if line.strip()]
+
+    def _digest_tail(self, handle, size: int) -> bytes:
+        start = max(0, size - self.TAIL_CHECK_SIZE)
+        handle.seek(start)
+        return hashlib.blake2b(handle.read(size - start), digest_size=16).digest()
+
+    def prime(self) -> None:
+        """Reads the current content as the baseline without reporting it as added"""
+        self._lines.clear()
+        self._stat = None
+        self.poll()
+
+    def poll(self) -> LinesDiff:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return LinesDiff()
+
+        current = (stat.st_mtime_ns, stat.st_size)
+        if current == self._stat:
+            return LinesDiff()
+
+        previous_size = self._stat[1] if self._stat else 0
+        with open(self.path, "rb") as handle:
+            appended = (
+                self._stat is not None
+                and stat.st_size > previous_size
+                and self._ends_with_newline
+                and self._digest_tail(handle, previous_size) == self._tail_digest
+            )
+
+            if appended:
+                handle.seek(previous_size)
+                lines = self._split(handle.read())
+                diff = LinesDiff(added=[line for line in dict.fromkeys(lines) if line not in self._lines])
+                self._lines.update(diff.added)
+            else:
+                handle.seek(0)
+                lines = set(self._split(handle.read()))
+                diff = LinesDiff(added=list(lines - self._lines), removed=list(self._lines - lines))
+                self._lines = lines
+
+            self._tail_digest = self._digest_tail(handle, stat.st_size)
+            handle.seek(max(0, stat.st_size - 1))
+            self._ends_with_newline = handle.read(1) in (b"\n", b"")
+
+        self._stat = current
+        return diff
@@ -5,7 +5,7 @@ from pathlib import Path
 from typing import Dict, List, Generator, Union, Optional, Literal
 
 from loguru import logger
-from better_proxy import Proxy
+from utils.managers.proxy_table import proxy_table
 
 from models import Account, Config
 from sys import exit
@@ -68,13 +68,25 @@ class ConfigLoader:
             proxy_lines = self._read_file(
                 self.data_path / "proxies.txt", allow_empty=True
             )
-            for proxy in proxy_lines:
-                Proxy.from_str(proxy)
-
-            return [Proxy.from_str(proxy).as_url for proxy in proxy_lines]
+            return [proxy_table.url(proxy) for proxy in proxy_lines]
         except Exception as e:
             raise ConfigurationError(f"Failed to parse proxies: {e}")
 
+    @staticmethod
+    def parse_account(line: str, _type: Literal["default_accounts", "login_accounts"]) -> Account:
+        parts = line.split(":")
+        if _type == "login_accounts":
+            if len(parts) == 2:
+                email, password = parts
+                return Account(
+                    email=email.replace(" ", ""),
+                    email_password=password.replace(" ", ""),
+                )
+            else:
+                raise ConfigurationError(f"Invalid account format: {line}")
+
+        return Account(email=parts[0].replace(" ", ""))
+
     def _parse_accounts(
             self,
             filename: str,
@@ -89,19 +101,7 @@ class ConfigLoader:
                     if not line:
                         continue
 
-                    parts = line.split(":")
-                    if _type == "login_accounts":
-                        if len(parts) == 2:
-                            email, password = parts
-                            yield Account(
-                                email=email.replace(" ", ""),
-                                email_password=password.replace(" ", ""),
-                            )
-                        else:
-                            raise ConfigurationError(f"Invalid account format: {line}")
-                    else:
-                        email = parts[0].replace(" ", "")
-                        yield Account(email=email)
+                    yield self.parse_account(line, _type)
 
                 except (ValueError, IndexError):
                     logger.warning(f"Invalid account format: {line} | File: {filename}")
@@ -1,3 +1,10 @@
 from .console import *
-from .imap_utils import LinkExtractor, EmailValidator
+from .imap_utils import LinkExtractor, EmailValidator, used_codes
+from .code_store import UsedCodeStore
+from .imap_pool import IMAPConnectionPool
+from .imap_client import IMAPError, IMAPLoginError, IMAPThrottled
+from .imap_governor import IMAPHostGovernor
+from .imap_folders import FolderDirectory
+from .mail_parser import MailParser
 from .logs import *
+from .imap_dispatcher import RedirectCodeDispatcher
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Optional, Callable, Iterable
+
+
+CodeKey = tuple[str, str, str]
+
+
+class UsedCodeStore:
+    """Confirmation codes that were already handed out, keyed by (mailbox, code, message-id)."""
+
+    def __init__(self, ttl: float = 300, max_size: int = 10_000, listener: Optional[Callable[[CodeKey, float], None]] = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.listener = listener
+
+        self._lock = threading.Lock()
+        self._claims: OrderedDict[CodeKey, float] = OrderedDict()
+
+    @staticmethod
+    def make_key(mailbox: str, code: str, message_id: Optional[str]) -> CodeKey:
+        return mailbox.lower(), code, (message_id or "").strip()
+
+    def _evict(self, now: float, reserve: int = 0) -> None:
+        # Claims are kept in insertion order, so expired ones are always at the front
+        while self._claims:
+            key, claimed_at = next(iter(self._claims.items()))
+            if now - claimed_at <= self.ttl and len(self._claims) + reserve <= self.max_size:
+                break
+            self._claims.popitem(last=False)
+
+    def claim(self, mailbox: str, code: str, message_id: Optional[str] = None) -> bool:
+        key = self.make_key(mailbox, code, message_id)
+        now = time.time()
+
+        with self._lock:
+            self._evict(now, reserve=1)
+            if key in self._claims:
+                return False
+
+            self._claims[key] = now
+
+        if self.listener:
+            self.listener(key, now)
+        return True
+
+    def load(self, claims: Iterable[tuple[CodeKey, float]]) -> int:
+        now = time.time()
+        fresh = sorted((claimed_at, key) for key, claimed_at in claims if now - claimed_at <= self.ttl)
+
+        with self._lock:
+            for claimed_at, key in fresh:
+                self._claims[key] = claimed_at
+            self._evict(now)
+
+        return len(fresh)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._claims)
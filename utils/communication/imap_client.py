@@ -0,0 +1,399 @@
+import asyncio
+import base64
+import email
+import email.header
+import re
+import ssl
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email import policy
+from email.utils import getaddresses, parseaddr, parsedate_to_datetime
+from typing import Optional, Iterable
+from better_proxy import Proxy
+from python_socks.async_.asyncio import Proxy as AsyncProxy
+
+
+class IMAPError(Exception):
+    """Raised when the server rejects a command"""
+
+    pass
+
+
+class IMAPLoginError(IMAPError):
+    """Raised when the server rejects the credentials"""
+
+    pass
+
+
+class IMAPThrottled(IMAPError):
+    """Raised when the server refuses a login because of connection or rate limits"""
+
+    pass
+
+
+class IMAPConnectionLost(ConnectionError):
+    """Raised when the connection was closed, reset or timed out"""
+
+    pass
+
+
+EPOCH = datetime(1900, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class FolderInfo:
+    name: str
+    flags: tuple[str, ...]
+    delim: str
+
+
+@dataclass
+class MailMessage:
+    uid: str
+    from_: str = ""
+    to: tuple[str, ...] = ()
+    subject: str = ""
+    date: datetime = EPOCH
+    text: str = ""
+    html: str = ""
+    headers: dict[str, str] = field(default_factory=dict)
+    code: Optional[str] = None
+
+
+def imap_utf7_encode(value: str) -> str:
+    result, pending = [], []
+
+    def flush() -> None:
+        if pending:
+            encoded = base64.b64encode("".join(pending).encode("utf-16-be")).decode().rstrip("=")
+            result.append("&" + encoded.replace("/", ",") + "-")
+            pending.clear()
+
+    for char in value:
+        if 0x20 <= ord(char) <= 0x7E:
+            flush()
+            result.append("&-" if char == "&" else char)
+        else:
+            pending.append(char)
+
+    flush()
+    return "".join(result)
+
+
+def imap_utf7_decode(value: str) -> str:
+    def decode(match: re.Match) -> str:
+        chunk = match.group(1)
+        if not chunk:
+            return "&"
+
+        chunk = chunk.replace(",", "/")
+        return base64.b64decode(chunk + "=" * (-len(chunk) % 4)).decode("utf-16-be")
+
+    return re.sub(r"&([^-]*)-", decode, value)
+
+
+def quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def parse_message(uid: str, raw: bytes) -> MailMessage:
+    message = email.message_from_bytes(raw, policy=policy.compat32)
+
+    def header(name: str) -> str:
+        value = message.get(name, "")
+        try:
+            return str(email.header.make_header(email.header.decode_header(value))) if value else ""
+        except Exception:
+            return str(value)
+
+    try:
+        date = parsedate_to_datetime(message.get("Date", ""))
+    except (TypeError, ValueError, IndexError):
+        date = EPOCH
+
+    text_parts, html_parts = [], []
+    for part in message.walk():
+        content_type = part.get_content_type()
+        if content_type not in ("text/plain", "text/html") or part.get_filename():
+            continue
+
+        payload = part.get_payload(decode=True) or b""
+        charset = part.get_content_charset() or "utf-8"
+        try:
+            content = payload.decode(charset, "replace")
+        except LookupError:
+            content = payload.decode("utf-8", "replace")
+
+        (text_parts if content_type == "text/plain" else html_parts).append(content)
+
+    return MailMessage(
+        uid=uid,
+        from_=parseaddr(header("From"))[1].lower(),
+        to=tuple(address.lower() for _, address in getaddresses([header("To")]) if address),
+        subject=header("Subject"),
+        date=date,
+        text="".join(text_parts),
+        html="".join(html_parts),
+        headers={key.lower(): header(key) for key in message.keys()},
+    )
+
+
+class AsyncIMAPClient:
+    """Minimal IMAP4rev1 client on asyncio streams (LOGIN, LIST, SELECT, STATUS, UID SEARCH/FETCH, IDLE)."""
+
+    LITERAL = re.compile(rb"\{(\d+)\+?\}\r\n$")
+    THROTTLED = re.compile(rb"\[(LIMIT|UNAVAILABLE|INUSE)\]|TOO MANY|RATE LIMIT|TRY AGAIN LATER", re.IGNORECASE)
+    STREAM_LIMIT = 1 << 20
+
+    def __init__(
+            self,
+            host: str,
+            *,
+            proxy: Optional[Proxy] = None,
+            port: int = 993,
+            timeout: float = 30,
+            rdns: bool = True,
+    ):
+        self.host = host
+        self.port = port
+        self.proxy = proxy
+        self.timeout = timeout
+        self.rdns = rdns
+
+        self.capabilities: set[str] = set()
+        self.selected: Optional[str] = None
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tag = 0
+
+    async def connect(self) -> None:
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+
+        try:
+            if self.proxy:
+                sock = await AsyncProxy.from_url(self.proxy.as_url, rdns=self.rdns).connect(
+                    dest_host=self.host, dest_port=self.port, timeout=self.timeout
+                )
+                connection = asyncio.open_connection(
+                    sock=sock, ssl=ssl_context, server_hostname=self.host, limit=self.STREAM_LIMIT
+                )
+            else:
+                connection = asyncio.open_connection(
+                    self.host, self.port, ssl=ssl_context, server_hostname=self.host, limit=self.STREAM_LIMIT
+                )
+
+            self._reader, self._writer = await asyncio.wait_for(connection, self.timeout)
+            greeting = await self._read_response()
+
+        except asyncio.TimeoutError:
+            raise IMAPConnectionLost(f"Connection to {self.host} timed out")
+
+        if not greeting[0].startswith((b"* OK", b"* PREAUTH")):
+            raise IMAPError(f"Unexpected greeting: {greeting[0]!r}")
+
+        await self.refresh_capabilities()
+
+    async def _read_line(self) -> bytes:
+        try:
+            line = await asyncio.wait_for(self._reader.readuntil(b"\r\n"), self.timeout)
+        except asyncio.TimeoutError:
+            raise IMAPConnectionLost(f"Read from {self.host} timed out")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, OSError) as error:
+            raise IMAPConnectionLost(f"Connection to {self.host} lost: {error}")
+
+        return line
+
+    async def _read_response(self) -> list[bytes]:
+        """Read one response line; literals are returned as separate chunks after the line that announced them."""
+        chunks = []
+        while True:
+            line = await self._read_line()
+            match = self.LITERAL.search(line)
+            if not match:
+                chunks.append(line[:-2])
+                return chunks
+
+            chunks.append(line[:match.start()])
+            try:
+                literal = await asyncio.wait_for(self._reader.readexactly(int(match.group(1))), self.timeout)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError) as error:
+                raise IMAPConnectionLost(f"Connection to {self.host} lost while reading literal: {error}")
+            chunks.append(literal)
+
+    async def _send(self, data: bytes) -> None:
+        try:
+            self._writer.write(data)
+            await asyncio.wait_for(self._writer.drain(), self.timeout)
+        except (asyncio.TimeoutError, OSError) as error:
+            raise IMAPConnectionLost(f"Write to {self.host} failed: {error}")
+
+    async def command(self, name: str, *args: str | bytes) -> list[list[bytes]]:
+        if self._writer is None:
+            raise IMAPConnectionLost("Not connected")
+
+        self._tag += 1
+        tag = f"A{self._tag:04d}".encode()
+
+        line = tag + b" " + name.encode()
+        for arg in args:
+            if isinstance(arg, bytes):
+                # Synchronizing literal for values that cannot be quoted (8-bit passwords)
+                await self._send(line + b" {%d}\r\n" % len(arg))
+                continuation = await self._read_response()
+                if not continuation[0].startswith(b"+"):
+                    raise IMAPError(f"{name} rejected: {continuation[0]!r}")
+                line = arg
+            else:
+                line += b" " + arg.encode()
+
+        await self._send(line + b"\r\n")
+
+        untagged = []
+        while True:
+            response = await self._read_response()
+            if response[0].startswith(tag + b" "):
+                status = response[0][len(tag) + 1:]
+                if not status.startswith(b"OK"):
+                    if name == "LOGIN" and status.startswith(b"NO"):
+                        if self.THROTTLED.search(status):
+                            raise IMAPThrottled(f"Login throttled by server: {status.decode(errors='replace')}")
+                        raise IMAPLoginError(status.decode(errors="replace"))
+                    raise IMAPError(f"{name} failed: {status.decode(errors='replace')}")
+                return untagged
+
+            if response[0].startswith(b"* BYE") and name != "LOGOUT":
+                raise IMAPConnectionLost(f"Server closed connection: {response[0].decode(errors='replace')}")
+
+            untagged.append(response)
+
+    @staticmethod
+    def _argument(value: str) -> str | bytes:
+        return quote(value) if value.isascii() else value.encode()
+
+    async def refresh_capabilities(self) -> None:
+        for response in await self.command("CAPABILITY"):
+            if response[0].upper().startswith(b"* CAPABILITY "):
+                self.capabilities = set(response[0][13:].decode().upper().split())
+
+    async def login(self, user: str, password: str) -> "AsyncIMAPClient":
+        await self.command("LOGIN", self._argument(user), self._argument(password))
+        await self.refresh_capabilities()
+        return self
+
+    async def noop(self) -> None:
+        await self.command("NOOP")
+
+    async def logout(self) -> None:
+        try:
+            await asyncio.wait_for(self.command("LOGOUT"), 5)
+        except Exception:
+            pass
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await asyncio.wait_for(self._writer.wait_closed(), 5)
+            except Exception:
+                pass
+            self._writer = None
+
+    async def list_folders(self) -> list[FolderInfo]:
+        folders = []
+        for response in await self.command("LIST", '""', '"*"'):
+            match = re.match(rb'\* LIST \(([^)]*)\) (NIL|"(?:[^"\\]|\\.)*") ?(.*)', response[0])
+            if not match:
+                continue
+
+            flags = tuple(match.group(1).decode().split())
+            delim = match.group(2).decode().strip('"')
+            name = response[1] if len(response) > 1 and not match.group(3) else match.group(3)
+            name = name.decode(errors="replace")
+            if name.startswith('"'):
+                name = name[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+
+            folders.append(FolderInfo(name=imap_utf7_decode(name), flags=flags, delim=delim))
+
+        return folders
+
+    @staticmethod
+    def _status_items(data: bytes) -> dict[str, int]:
+        items = re.findall(rb"(UIDVALIDITY|UIDNEXT|MESSAGES|UNSEEN|RECENT|EXISTS) (\d+)", data.upper())
+        return {key.decode(): int(value) for key, value in items}
+
+    async def select(self, folder: str, readonly: bool = False) -> dict[str, int]:
+        responses = await self.command("EXAMINE" if readonly else "SELECT", quote(imap_utf7_encode(folder)))
+        self.selected = folder
+
+        info = {}
+        for response in responses:
+            line = response[0].upper()
+            if line.endswith(b" EXISTS"):
+                info["EXISTS"] = int(line.split()[1])
+            else:
+                info.update(self._status_items(line))
+
+        return info
+
+    async def status(self, folder: str, items: Iterable[str] = ("UIDNEXT", "UIDVALIDITY")) -> dict[str, int]:
+        responses = await self.command("STATUS", quote(imap_utf7_encode(folder)), f"({' '.join(items)})")
+        info = {}
+        for response in responses:
+            info.update(self._status_items(b" ".join(response).rsplit(b"(", 1)[-1]))
+        return info
+
+    async def uid_search(self, criteria: str) -> list[int]:
+        uids = []
+        for response in await self.command("UID SEARCH", criteria):
+            if response[0].upper().startswith(b"* SEARCH"):
+                uids.extend(int(uid) for uid in response[0][8:].split())
+        return sorted(uids)
+
+    async def uid_fetch_raw(self, uids: Iterable[int | str], headers_only: bool = False, mark_seen: bool = True) -> list[tuple[str, bytes]]:
+        uid_set = ",".join(str(uid) for uid in uids)
+        if not uid_set:
+            return []
+
+        section = "BODY.PEEK[HEADER]" if headers_only else ("BODY[]" if mark_seen else "BODY.PEEK[]")
+        messages = []
+        for response in await self.command("UID FETCH", uid_set, f"(UID {section})"):
+            match = re.search(rb"UID (\d+)", b" ".join(chunk for chunk in response[::2]))
+            if match and len(response) > 1:
+                messages.append((match.group(1).decode(), response[1]))
+
+        return messages
+
+    async def uid_fetch(self, uids: Iterable[int | str], headers_only: bool = False, mark_seen: bool = True) -> list[MailMessage]:
+        return [parse_message(uid, raw) for uid, raw in await self.uid_fetch_raw(uids, headers_only, mark_seen)]
+
+    async def idle(self, timeout: float) -> list[bytes]:
+        """Wait in IDLE until the server reports a change or `timeout` expires; returns untagged responses."""
+        self._tag += 1
+        tag = f"A{self._tag:04d}".encode()
+        await self._send(tag + b" IDLE\r\n")
+
+        continuation = await self._read_response()
+        if not continuation[0].startswith(b"+"):
+            raise IMAPError(f"IDLE rejected: {continuation[0]!r}")
+
+        responses = []
+        try:
+            line = await asyncio.wait_for(self._reader.readuntil(b"\r\n"), timeout)
+            responses.append(line[:-2])
+        except asyncio.TimeoutError:
+            pass
+        except (asyncio.IncompleteReadError, OSError) as error:
+            raise IMAPConnectionLost(f"Connection to {self.host} lost in IDLE: {error}")
+
+        await self._send(b"DONE\r\n")
+        while True:
+            response = await self._read_response()
+            if response[0].startswith(tag + b" "):
+                return responses
+            responses.append(response[0])
@@ -0,0 +1,150 @@
+import asyncio
+
+from collections import defaultdict
+from typing import Optional
+from better_proxy import Proxy
+from loguru import logger
+
+from utils.processing.metrics import metrics
+from .imap_client import IMAPLoginError
+from .imap_folders import FolderDirectory
+from .imap_pool import IMAPConnectionPool
+from .mail_parser import MailParser
+from .imap_utils import LinkExtractor
+
+
+class RedirectCodeDispatcher:
+    """Reads a shared redirect mailbox once per poll and routes codes to waiting accounts by the To: address."""
+
+    def __init__(
+            self,
+            imap_server: str,
+            email: str,
+            password: str,
+            pool: IMAPConnectionPool,
+            max_attempts: int = 8,
+            delay_seconds: int = 5,
+            fetch_limit: int = 50,
+            folders: Optional[FolderDirectory] = None,
+            parser: Optional[MailParser] = None,
+    ):
+        self.email = email
+        self.pool = pool
+        self.max_attempts = max_attempts
+        self.delay_seconds = delay_seconds
+
+        self._extractor = LinkExtractor(
+            imap_server=imap_server,
+            email=email,
+            password=password,
+            pool=pool,
+            fetch_limit=fetch_limit,
+            folders=folders,
+            parser=parser,
+        )
+        self._waiters: dict[str, asyncio.Future] = {}
+        self._unclaimed: dict[str, list] = {}
+        self._proxy: Optional[Proxy] = None
+        self._poller: Optional[asyncio.Task] = None
+
+    async def extract_link(self, redirect_email: str, proxy: Optional[Proxy] = None) -> dict:
+        logger.info(f"Account: {redirect_email} | Waiting for code in redirect mailbox {self.email}...")
+
+        code = await self.wait_for_code(redirect_email, proxy)
+        if code:
+            return {
+                "status": True,
+                "data": code,
+            }
+
+        logger.error(f"Account: {redirect_email} | Max attempts reached, code not found in redirect mailbox")
+        return {
+            "status": False,
+            "data": "Max attempts reached",
+        }
+
+    async def wait_for_code(self, redirect_email: str, proxy: Optional[Proxy] = None) -> Optional[str]:
+        recipient = redirect_email.lower()
+        previous = self._waiters.get(recipient)
+        if previous and not previous.done():
+            previous.set_result(None)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[recipient] = future
+        metrics.set_gauge("imap.redirect.waiters", len(self._waiters))
+
+        # Each message is fetched only once, so mail that arrived before this account started waiting is replayed
+        if unclaimed := self._unclaimed.pop(recipient, None):
+            self._route(recipient, unclaimed)
+
+        if proxy:
+            self._proxy = proxy
+
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+
+        try:
+            return await asyncio.wait_for(future, timeout=self.max_attempts * self.delay_seconds)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if self._waiters.get(recipient) is future:
+                del self._waiters[recipient]
+            metrics.set_gauge("imap.redirect.waiters", len(self._waiters))
+
+    async def _poll(self) -> None:
+        while self._waiters:
+            try:
+                async with self.pool.connection(
+                        self._extractor.imap_server, self.email, self._extractor.password, self._proxy
+                ) as connection:
+                    messages = await self._extractor.collect_candidates(connection.client)
+
+                metrics.increment("imap.redirect.polls")
+                self._dispatch(messages)
+
+            except IMAPLoginError as error:
+                # Retrying would not fix the credentials, every waiting account fails with the login error
+                logger.error(f"Redirect mailbox: {self.email} | Login failed: {error}")
+                for future in self._waiters.values():
+                    if not future.done():
+                        future.set_exception(error)
+                return
+
+            except ConnectionError as error:
+                logger.warning(f"Redirect mailbox: {self.email} | IMAP connection lost: {error} | Reconnecting..")
+
+            except Exception as error:
+                logger.error(f"Redirect mailbox: {self.email} | Error while fetching messages: {error}")
+
+            if self._waiters:
+                await asyncio.sleep(self.delay_seconds)
+
+    def _dispatch(self, messages: list) -> None:
+        by_recipient = defaultdict(list)
+        for msg, msg_date in messages:
+            for recipient in msg.to:
+                by_recipient[recipient.lower()].append((msg, msg_date))
+
+        for recipient, recipient_messages in by_recipient.items():
+            if recipient in self._waiters:
+                self._route(recipient, recipient_messages)
+            else:
+                self._unclaimed.setdefault(recipient, []).extend(recipient_messages)
+
+        for recipient in list(self._unclaimed):
+            fresh = [(msg, msg_date) for msg, msg_date in self._unclaimed[recipient] if self._extractor.is_fresh(msg_date)]
+            if fresh:
+                self._unclaimed[recipient] = fresh
+            else:
+                del self._unclaimed[recipient]
+
+    def _route(self, recipient: str, messages: list) -> None:
+        future = self._waiters.get(recipient)
+        if not future or future.done():
+            return
+
+        code = self._extractor.claim_code(messages, owner=recipient)
+        if code:
+            metrics.increment("imap.redirect.routed")
+            future.set_result(code)
@@ -0,0 +1,71 @@
+import re
+import threading
+import time
+
+from collections import defaultdict
+from typing import Optional, Iterable
+
+
+class FolderDirectory:
+    """Cached folder lists per mailbox and the order in which they are searched for codes."""
+
+    SKIPPED_FLAGS = frozenset({"\\noselect", "\\nonexistent", "\\sent", "\\drafts", "\\trash", "\\all", "\\flagged"})
+    SKIPPED_NAMES = re.compile(r"(^|/|\.)(\[gmail\]|gmail|sent( items| messages| mail)?|drafts?|trash|deleted( items| messages)?|bin|outbox|templates|all mail)$", re.IGNORECASE)
+    SPAM_NAMES = re.compile(r"spam|junk|bulk", re.IGNORECASE)
+
+    def __init__(self, ttl: float = 3600, allowed_folders: Optional[Iterable[str]] = None):
+        self.ttl = ttl
+        self.allowed_folders = [folder.lower() for folder in allowed_folders or []]
+
+        self._lock = threading.Lock()
+        self._folders: dict[tuple[str, str], tuple[float, list[str]]] = {}
+        self._hits: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def is_searchable(self, name: str, flags: Iterable[str] = ()) -> bool:
+        if self.allowed_folders:
+            return name.lower() in self.allowed_folders
+
+        if any(flag.lower() in self.SKIPPED_FLAGS for flag in flags):
+            return False
+
+        return not self.SKIPPED_NAMES.search(name)
+
+    def get(self, server: str, email: str) -> Optional[list[str]]:
+        with self._lock:
+            cached = self._folders.get((server, email.lower()))
+
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+
+        return None
+
+    def set(self, server: str, email: str, folders: list[str]) -> None:
+        with self._lock:
+            self._folders[(server, email.lower())] = (time.monotonic(), folders)
+
+    def invalidate(self, server: str, email: str) -> None:
+        with self._lock:
+            self._folders.pop((server, email.lower()), None)
+
+    def record_hit(self, server: str, folder: str) -> None:
+        with self._lock:
+            self._hits[server][folder] += 1
+
+    def rank(self, server: str, folders: list[str]) -> list[str]:
+        if self.allowed_folders:
+            order = {name: index for index, name in enumerate(self.allowed_folders)}
+            return sorted(folders, key=lambda folder: order.get(folder.lower(), len(order)))
+
+        with self._lock:
+            hits = dict(self._hits.get(server, {}))
+
+        def priority(folder: str) -> tuple[int, int]:
+            if folder.upper() == "INBOX":
+                default = 0
+            elif self.SPAM_NAMES.search(folder):
+                default = 1
+            else:
+                default = 2
+            return -hits.get(folder, 0), default
+
+        return sorted(folders, key=priority)
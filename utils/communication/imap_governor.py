@@ -0,0 +1,26 @@
+from typing import Optional
+
+from utils.managers.limiter import ConcurrencyLimiter
+
+
+class IMAPHostGovernor:
+    """Per-IMAP-server caps on open connections and new logins per minute."""
+
+    def __init__(self, limits: Optional[dict[str, dict]] = None, max_connections: int = 20, logins_per_minute: int = 60):
+        self.limits = {host.lower(): value for host, value in (limits or {}).items()}
+        self.max_connections = max_connections
+        self.logins_per_minute = logins_per_minute
+        self._limiters: dict[str, ConcurrencyLimiter] = {}
+
+    def limiter(self, host: str) -> ConcurrencyLimiter:
+        host = host.lower()
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limits = self.limits.get(host, {})
+            limiter = self._limiters[host] = ConcurrencyLimiter(
+                name=f"imap.host[{host}]",
+                max_concurrent=limits.get("max_connections", self.max_connections),
+                rate_per_minute=limits.get("logins_per_minute", self.logins_per_minute),
+            )
+
+        return limiter
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import time
+
+from contextlib import asynccontextmanager
+from typing import Optional, AsyncIterator, Callable
+from better_proxy import Proxy
+from loguru import logger
+
+from utils.processing.metrics import metrics
+from .imap_client import AsyncIMAPClient, IMAPThrottled
+from .imap_governor import IMAPHostGovernor
+
+
+PoolKey = tuple[str, str, Optional[str], str]
+
+
+class IMAPConnection:
+    def __init__(self, key: PoolKey, client: AsyncIMAPClient, on_close: Optional[Callable[[], None]] = None):
+        self.key = key
+        self.client = client
+        self._on_close = on_close
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_seen_alive = self.created_at
+        self.broken = False
+
+    @property
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_used
+
+    @property
+    def unchecked_for(self) -> float:
+        return time.monotonic() - self.last_seen_alive
+
+    async def noop(self) -> bool:
+        try:
+            await self.client.noop()
+            self.last_seen_alive = time.monotonic()
+            return True
+        except Exception:
+            self.broken = True
+            return False
+
+    async def close(self) -> None:
+        try:
+            await self.client.logout()
+        finally:
+            if self._on_close:
+                self._on_close()
+                self._on_close = None
+
+
+class IMAPConnectionPool:
+    """Authenticated IMAP connections keyed by (server, user, proxy, password digest)."""
+
+    def __init__(
+            self,
+            max_connections_per_mailbox: int = 2,
+            idle_timeout: float = 300,
+            keepalive_interval: float = 60,
+            connect_timeout: float = 30,
+            governor: Optional[IMAPHostGovernor] = None,
+    ):
+        self.max_connections_per_mailbox = max_connections_per_mailbox
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.connect_timeout = connect_timeout
+        self.governor = governor
+
+        self._idle: dict[PoolKey, list[IMAPConnection]] = {}
+        self._slots: dict[PoolKey, asyncio.Semaphore] = {}
+        self._janitor: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def make_key(server: str, email: str, proxy: Optional[Proxy], password: str = "") -> PoolKey:
+        # A session is only reused with the password it was logged in with
+        password_digest = hashlib.sha256((password or "").encode()).hexdigest()
+        return server.lower(), email.lower(), proxy.as_url if proxy else None, password_digest
+
+    async def _take_host_slot(self, server: str) -> Optional[Callable[[], None]]:
+        if not self.governor:
+            return None
+
+        limiter = self.governor.limiter(server)
+        if limiter.saturated:
+            await self._evict_idle(server)
+
+        waited = await limiter.wait()
+        metrics.observe("imap.governor.wait_seconds", waited)
+        return limiter.release
+
+    async def _evict_idle(self, server: str) -> None:
+        candidates = [
+            (connection.last_used, key, connection)
+            for key, idle in self._idle.items() if key[0] == server
+            for connection in idle
+        ]
+        if not candidates:
+            return
+
+        _, key, connection = min(candidates, key=lambda candidate: candidate[0])
+        self._idle[key].remove(connection)
+        metrics.increment("imap.governor.evictions")
+        await connection.close()
+
+    async def _connect(self, key: PoolKey, password: str, proxy: Optional[Proxy]) -> IMAPConnection:
+        server, email = key[0], key[1]
+        release_slot = await self._take_host_slot(server)
+        started = time.monotonic()
+        client = AsyncIMAPClient(server, proxy=proxy, timeout=self.connect_timeout)
+
+        try:
+            await client.connect()
+            await client.login(email, password)
+        except BaseException as error:
+            metrics.increment("imap.throttled" if isinstance(error, IMAPThrottled) else "imap.login_failures")
+            await client.close()
+            if release_slot:
+                release_slot()
+            raise
+
+        metrics.increment("imap.logins")
+        metrics.observe("imap.login_seconds", time.monotonic() - started)
+        return IMAPConnection(key, client, on_close=release_slot)
+
+    async def _checkout(self, key: PoolKey, password: str, proxy: Optional[Proxy]) -> IMAPConnection:
+        idle = self._idle.get(key, [])
+
+        while idle:
+            connection = idle.pop()
+            if connection.idle_for > self.idle_timeout:
+                await connection.close()
+                continue
+
+            if connection.unchecked_for > self.keepalive_interval and not await connection.noop():
+                await connection.close()
+                continue
+
+            metrics.increment("imap.pool.hits")
+            return connection
+
+        metrics.increment("imap.pool.misses")
+        return await self._connect(key, password, proxy)
+
+    async def _checkin(self, connection: IMAPConnection) -> None:
+        if connection.broken or self.idle_timeout <= 0:
+            await connection.close()
+            return
+
+        # Someone is queued for this server, hand the slot over instead of keeping an idle session
+        if self.governor and self.governor.limiter(connection.key[0]).waiting:
+            await connection.close()
+            return
+
+        connection.last_used = connection.last_seen_alive = time.monotonic()
+        self._idle.setdefault(connection.key, []).append(connection)
+        self._ensure_janitor()
+
+    @asynccontextmanager
+    async def connection(
+            self,
+            server: str,
+            email: str,
+            password: str,
+            proxy: Optional[Proxy] = None,
+    ) -> AsyncIterator[IMAPConnection]:
+        key = self.make_key(server, email, proxy, password)
+        slots = self._slots.setdefault(key, asyncio.Semaphore(self.max_connections_per_mailbox))
+
+        async with slots:
+            connection = await self._checkout(key, password, proxy)
+            try:
+                yield connection
+            except BaseException:
+                connection.broken = True
+                raise
+            finally:
+                connection.last_used = time.monotonic()
+                await self._checkin(connection)
+
+    def _ensure_janitor(self) -> None:
+        if self._janitor is None or self._janitor.done():
+            self._janitor = asyncio.create_task(self._maintain())
+
+    async def _maintain(self) -> None:
+        while any(self._idle.values()):
+            await asyncio.sleep(min(self.keepalive_interval, self.idle_timeout))
+
+            for key, idle in list(self._idle.items()):
+                for connection in list(idle):
+                    if connection.idle_for > self.idle_timeout:
+                        idle.remove(connection)
+                        await connection.close()
+
+                    elif connection.unchecked_for > self.keepalive_interval:
+                        idle.remove(connection)
+                        if await connection.noop():
+                            idle.append(connection)
+                        else:
+                            logger.debug(f"IMAP connection to {key[0]} for {key[1]} dropped by server, evicted")
+                            await connection.close()
+
+                if not idle:
+                    self._idle.pop(key, None)
+
+            metrics.set_gauge("imap.pool.idle", sum(len(idle) for idle in self._idle.values()))
+
+    async def close(self) -> None:
+        if self._janitor:
+            self._janitor.cancel()
+
+        for idle in self._idle.values():
+            for connection in idle:
+                await connection.close()
+
+        self._idle.clear()
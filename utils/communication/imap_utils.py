@@ -1,128 +1,49 @@
-import os
-import ssl
-import re
+import time
 import asyncio
-from typing import Optional, Dict
-from datetime import datetime, timezone
+from typing import Optional, Dict, TYPE_CHECKING
+from datetime import datetime, timezone, timedelta
 from loguru import logger
-from imap_tools import MailBox, AND, MailboxLoginError
-from imaplib import IMAP4, IMAP4_SSL
 from better_proxy import Proxy
-from python_socks.sync import Proxy as SyncProxy
 
 from models import OperationResult, Account
+from .imap_client import AsyncIMAPClient, IMAPLoginError, IMAPThrottled, MailMessage
+from .imap_folders import FolderDirectory
+from .code_store import UsedCodeStore
+from .mail_parser import MailParser
 
-os.environ['SSLKEYLOGFILE'] = ''
-
-
-class IMAP4Proxy(IMAP4):
-    def __init__(
-            self,
-            host: str,
-            proxy: Proxy,
-            *,
-            port: int = 993,
-            rdns: bool = True,
-            timeout: float = None,
-    ):
-        self._host = host
-        self._port = port
-        self._proxy = proxy
-        self._pysocks_proxy = SyncProxy.from_url(self._proxy.as_url, rdns=rdns)
-        super().__init__(host, port, timeout)
-
-    def _create_socket(self, timeout):
-        return self._pysocks_proxy.connect(self._host, self._port, timeout)
-
-
-class IMAP4SSlProxy(IMAP4Proxy):
-    def __init__(
-            self,
-            host: str,
-            proxy: Proxy,
-            *,
-            port: int = 993,
-            rdns: bool = True,
-            ssl_context=None,
-            timeout: float = None,
-    ):
-        self.ssl_context = ssl_context or ssl._create_unverified_context()
-        super().__init__(host, proxy, port=port, rdns=rdns, timeout=timeout)
-
-    def _create_socket(self, timeout):
-        sock = super()._create_socket(timeout)
-        server_hostname = self.host if ssl.HAS_SNI else None
-        return self.ssl_context.wrap_socket(sock, server_hostname=server_hostname)
-
-
-class MailBoxClient(MailBox):
-    def __init__(
-            self,
-            host: str,
-            *,
-            proxy: Optional[Proxy] = None,
-            port: int = 993,
-            timeout: float = None,
-            rdns: bool = True,
-            ssl_context=None,
-    ):
-        self._proxy = proxy
-        self._rdns = rdns
-        super().__init__(host=host, port=port, timeout=timeout, ssl_context=ssl_context)
-
-    def _get_mailbox_client(self):
-        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS)
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-
-        if self._proxy:
-            return IMAP4SSlProxy(
-                self._host,
-                self._proxy,
-                port=self._port,
-                rdns=self._rdns,
-                timeout=self._timeout,
-                ssl_context=ssl_context,
-            )
-        else:
-            return IMAP4_SSL(
-                self._host,
-                port=self._port,
-                timeout=self._timeout,
-                ssl_context=ssl_context,
-            )
+if TYPE_CHECKING:
+    from .imap_pool import IMAPConnectionPool
 
 
 class EmailValidator:
-    def __init__(self, imap_server: str, email: str, password: str):
+    def __init__(self, imap_server: str, email: str, password: str, pool: "IMAPConnectionPool"):
         self.imap_server = imap_server
         self.email = email
         self.password = password
+        self.pool = pool
 
     async def validate(self, proxy: Optional[Proxy] = None) -> dict:
         logger.info(f"Account: {self.email} | Checking if email is valid...")
 
         try:
-            def login_sync():
-                with MailBoxClient(
-                        host=self.imap_server,
-                        proxy=proxy,
-                        timeout=30
-                ).login(self.email, self.password):
-                    return True
-
-            await asyncio.to_thread(login_sync)
+            async with self.pool.connection(self.imap_server, self.email, self.password, proxy):
+                pass
+
             return {
                 "status": True,
                 "data": f"Valid:{datetime.now()}",
             }
 
-        except MailboxLoginError:
+        except IMAPLoginError:
             return {
                 "status": False,
                 "data": "Invalid credentials",
             }
 
+        except IMAPThrottled:
+            # Says nothing about the mailbox, the caller's attempt loop retries it
+            raise
+
         except Exception as error:
             return {
                 "status": False,
@@ -130,83 +51,123 @@ class EmailValidator:
             }
 
 
-class LinkCache:
-    def __init__(self):
-        self._used_links: Dict[str, str] = {}
-
-    def is_link_used(self, link: str) -> bool:
-        return link in self._used_links
-
-    def add_link(self, email: str, link: str) -> None:
-        self._used_links[link] = email
+default_folders = FolderDirectory()
+default_parser = MailParser()
 
 
 class LinkExtractor:
-    _link_cache = LinkCache()
 
     def __init__(
             self,
             imap_server: str,
             email: str,
             password: str,
+            pool: "IMAPConnectionPool",
             max_attempts: int = 8,
             delay_seconds: int = 5,
             redirect_email: Optional[str] = None,
+            use_idle: bool = False,
+            idle_rescan_interval: int = 15,
+            fetch_limit: int = 10,
+            folders: Optional[FolderDirectory] = None,
+            parser: Optional[MailParser] = None,
     ):
         self.imap_server = imap_server
         self.email = email
         self.password = password
+        self.pool = pool
         self.max_attempts = max_attempts
         self.delay_seconds = delay_seconds
         self.redirect_email = redirect_email
-        self.link_patterns = [
-            r">\s*(\d{6})\s*<",  # Pattern for code between HTML tags
-            r"(?:^|\s)(\d{6})(?:\s|$)"  # Pattern for standalone 6-digit code
-        ]
+        self.use_idle = use_idle
+        self.idle_rescan_interval = idle_rescan_interval
+        self.fetch_limit = fetch_limit
+        self.folders = folders or default_folders
+        self.parser = parser or default_parser
+        self._last_seen_uids: Dict[str, tuple[int, int]] = {}
 
     async def extract_link(self, proxy: Optional[Proxy] = None) -> OperationResult:
         logger.info(f"Account: {self.email} | Checking email for link...")
         return await self.search_with_retries(proxy)
 
-    def _collect_messages(self, mailbox: MailBox):
-        messages = []
-
-        allowed_exact = {
-            "no-reply@privy.io",
-            "no-reply@mail.privy.io",
-        }
-
-        def to_from_prefix(email_like: str) -> str:
-            s = email_like.strip().lower()
-            s = s.replace('-', '_').replace('@', '_at_').replace('.', '_')
-            return s
+    ALLOWED_SENDERS = frozenset({
+        "no-reply@privy.io",
+        "no-reply@mail.privy.io",
+    })
+    MAX_MESSAGE_AGE = 300
+
+    @staticmethod
+    def _to_from_prefix(email_like: str) -> str:
+        s = email_like.strip().lower()
+        s = s.replace('-', '_').replace('@', '_at_').replace('.', '_')
+        return s
+
+    @staticmethod
+    def _message_date(msg: MailMessage) -> datetime:
+        return msg.date.replace(tzinfo=timezone.utc) if msg.date.tzinfo is None else msg.date
+
+    def _is_allowed_message(self, msg: MailMessage) -> bool:
+        f = (msg.from_ or "").lower()
+        allowed_prefix = {self._to_from_prefix(e) for e in self.ALLOWED_SENDERS}
+        if not (any(f.startswith(p) for p in allowed_prefix) or f in self.ALLOWED_SENDERS):
+            return False
+
+        if self.redirect_email and self.redirect_email.lower() not in msg.to:
+            return False
+
+        return True
+
+    def _search_criteria(self) -> str:
+        # IMAP FROM/TO are substring matches, "privy_io" covers forwarders that rewrite the sender
+        # (no_reply_at_privy_io_...), exact senders are verified on the fetched headers
+        since = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%d-%b-%Y")
+        criteria = f'OR FROM "privy.io" FROM "privy_io" SINCE {since}'
+        if self.redirect_email:
+            criteria += f' TO "{self.redirect_email}"'
+        return criteria
+
+    def is_fresh(self, msg_date: datetime) -> bool:
+        return (datetime.now(timezone.utc) - msg_date).total_seconds() <= self.MAX_MESSAGE_AGE
+
+    async def _fetch_candidates(self, client: AsyncIMAPClient, uids: list[int]) -> list:
+        if not uids:
+            return []
+
+        candidate_uids = [
+            msg.uid
+            for msg in await self.parser.parse(await client.uid_fetch_raw(uids, headers_only=True))
+            if self._is_allowed_message(msg) and self.is_fresh(self._message_date(msg))
+        ]
+        if not candidate_uids:
+            return []
 
-        allowed_prefix = {to_from_prefix(e) for e in allowed_exact}
+        return [
+            (msg, self._message_date(msg))
+            for msg in await self.parser.parse(await client.uid_fetch_raw(candidate_uids, mark_seen=True))
+        ]
 
-        for sender in allowed_exact:
-            for msg in mailbox.fetch(reverse=True, criteria=AND(from_=sender), limit=10, mark_seen=True):
-                if self.redirect_email and self.redirect_email != msg.to[0]:
-                    continue
-                msg_date = msg.date.replace(tzinfo=timezone.utc) if msg.date.tzinfo is None else msg.date
-                messages.append((msg, msg_date))
+    async def _collect_messages(self, client: AsyncIMAPClient, folder: str, uid_validity: int = 0):
+        last_validity, last_seen_uid = self._last_seen_uids.get(folder, (uid_validity, 0))
+        if last_validity != uid_validity:
+            last_seen_uid = 0
 
-        for msg in mailbox.fetch(reverse=True, limit=10, mark_seen=True):
-            f = (msg.from_ or "").lower()
-            if any(f.startswith(p) for p in allowed_prefix) or f in allowed_exact:
-                if self.redirect_email and self.redirect_email != msg.to[0]:
-                    continue
-                msg_date = msg.date.replace(tzinfo=timezone.utc) if msg.date.tzinfo is None else msg.date
-                messages.append((msg, msg_date))
+        new_uids = [uid for uid in await client.uid_search(self._search_criteria()) if uid > last_seen_uid]
+        if not new_uids:
+            return []
 
+        # Moved only after a successful fetch, a failed one is retried on the next poll
+        messages = await self._fetch_candidates(client, new_uids[-self.fetch_limit:])
+        self._last_seen_uids[folder] = (uid_validity, new_uids[-1])
         return messages
 
-    def _process_latest_message(self, messages):
+    def claim_code(self, messages, owner: Optional[str] = None):
+        """Code of the latest fresh message, None if it is missing or already claimed for this mailbox"""
         if not messages:
             return None
 
         try:
             if self.redirect_email:
-                filtered_messages = [(msg, date) for msg, date in messages if self.redirect_email in msg.to]
+                filtered_messages = [(msg, date) for msg, date in messages if self.redirect_email.lower() in msg.to]
                 if not filtered_messages:
                     return None
 
@@ -217,51 +178,131 @@ class LinkExtractor:
         except (ValueError, AttributeError):
             return None
 
-        msg_age = (datetime.now(timezone.utc) - latest_date).total_seconds()
-        if msg_age > 300:
+        if not self.is_fresh(latest_date):
             return None
 
-        body = latest_msg.text or latest_msg.html
-        if not body:
+        # Codes are extracted while parsing (see MailParser), possibly in a worker process
+        code = latest_msg.code
+        if not code:
             return None
 
-        for link_pattern in self.link_patterns:
-            if match := re.search(link_pattern, body):
-                code = str(match.group(1))
+        mailbox = owner or self.redirect_email or self.email
+        if not used_codes.claim(mailbox, code, latest_msg.headers.get("message-id")):
+            return None
 
-                if self._link_cache.is_link_used(code):
-                    return None
+        return code
+
+    async def _list_folders(self, client: AsyncIMAPClient) -> list[str]:
+        folders = self.folders.get(self.imap_server, self.email)
+        if folders is None:
+            folders = [
+                folder.name
+                for folder in await client.list_folders()
+                if self.folders.is_searchable(folder.name, folder.flags)
+            ]
+            self.folders.set(self.imap_server, self.email, folders)
+
+        return self.folders.rank(self.imap_server, folders)
 
-                self._link_cache.add_link(self.email, code)
+    async def _collect_folder(self, client: AsyncIMAPClient, folder: str) -> list:
+        try:
+            info = await client.select(folder)
+            return await self._collect_messages(client, folder, info.get("UIDVALIDITY", 0))
+
+        except ConnectionError:
+            raise
+
+        except Exception as e:
+            # Folder was most likely renamed or removed, list folders again on the next poll
+            # logger.warning(f"Account: {self.email} | Error in folder {folder}: {str(e)} | Skipping...")
+            self.folders.invalidate(self.imap_server, self.email)
+            return []
+
+    async def _search_folders(self, client: AsyncIMAPClient) -> Optional[str]:
+        for folder in await self._list_folders(client):
+            messages = await self._collect_folder(client, folder)
+            if messages and (code := self.claim_code(messages)):
+                self.folders.record_hit(self.imap_server, folder)
                 return code
 
         return None
 
+    async def collect_candidates(self, client: AsyncIMAPClient) -> list:
+        """New (message, date) pairs from Privy in all searchable folders"""
+        all_messages = []
+        for folder in await self._list_folders(client):
+            all_messages.extend(await self._collect_folder(client, folder))
+
+        return all_messages
+
     async def _search_in_all_folders(self, proxy: Optional[Proxy]) -> Optional[str]:
-        def search_in():
-            all_messages = []
-            with MailBoxClient(host=self.imap_server, proxy=proxy, timeout=30).login(self.email, self.password) as mailbox:
-                for folder in mailbox.folder.list():
-                    if folder.name.lower() == "gmail":
-                        continue
+        async with self.pool.connection(self.imap_server, self.email, self.password, proxy) as connection:
+            return await self._search_folders(connection.client)
+
+    async def _idle_for_messages(self, client: AsyncIMAPClient, uid_next: int, timeout: float) -> tuple[bool, list, int]:
+        info = await client.select("INBOX")
+        responses = await client.idle(timeout)
+        notified = any(response.upper().endswith(b" EXISTS") for response in responses)
+
+        # UID n:* always matches the newest message, so UIDs below n are dropped here
+        new_uids = [uid for uid in await client.uid_search(f"UID {uid_next}:*") if uid >= uid_next]
+        if not new_uids:
+            return notified, [], uid_next
+
+        messages = await self._fetch_candidates(client, new_uids)
+        self._last_seen_uids["INBOX"] = (info.get("UIDVALIDITY", 0), new_uids[-1])
+        return notified, messages, new_uids[-1] + 1
+
+    async def _search_with_idle(self, proxy: Optional[Proxy]) -> tuple[bool, Optional[str]]:
+        deadline = time.monotonic() + self.max_attempts * self.delay_seconds
 
-                    try:
-                        if mailbox.folder.exists(folder.name):
-                            mailbox.folder.set(folder.name)
-                            messages = self._collect_messages(mailbox)
-                            all_messages.extend(messages)
+        async with self.pool.connection(self.imap_server, self.email, self.password, proxy) as connection:
+            client = connection.client
+            if "IDLE" not in client.capabilities:
+                return False, None
 
-                    except Exception as e:
-                        # logger.warning(f"Account: {self.email} | Error in folder {folder.name}: {str(e)} | Skipping...")
-                        pass
+            uid_next = (await client.status("INBOX", ("UIDNEXT",))).get("UIDNEXT", 1)
+            code = await self._search_folders(client)
 
-                return self._process_latest_message(all_messages) if all_messages else None
+            while not code and (remaining := deadline - time.monotonic()) > 0:
+                notified, messages, uid_next = await self._idle_for_messages(
+                    client, uid_next, min(self.idle_rescan_interval, remaining)
+                )
+                code = self.claim_code(messages) if messages else None
 
-        return await asyncio.to_thread(search_in)
+                # Notifications only cover INBOX, other folders (Spam, Junk) are rescanned on idle timeout
+                if not code and not notified:
+                    code = await self._search_folders(client)
+
+            return True, code
 
     async def search_with_retries(self, proxy: Optional[Proxy] = None) -> dict:
+        if self.use_idle:
+            try:
+                supported, link = await self._search_with_idle(proxy)
+                if supported:
+                    if link:
+                        return {
+                            "status": True,
+                            "data": link,
+                        }
+
+                    logger.error(f"Account: {self.email} | Code not received while waiting in IDLE mode")
+                    return {
+                        "status": False,
+                        "data": "Max attempts reached",
+                    }
+
+            except ConnectionError as error:
+                logger.warning(f"Account: {self.email} | IMAP connection lost in IDLE mode: {error} | Falling back to polling..")
+
         for attempt in range(self.max_attempts):
-            link = await self._search_in_all_folders(proxy)
+            try:
+                link = await self._search_in_all_folders(proxy)
+            except ConnectionError as error:
+                logger.warning(f"Account: {self.email} | IMAP connection lost: {error} | Reconnecting..")
+                link = None
+
             if link:
                 return {
                     "status": True,
@@ -277,3 +318,6 @@ class LinkExtractor:
             "status": False,
             "data": "Max attempts reached",
         }
+
+
+used_codes = UsedCodeStore(ttl=LinkExtractor.MAX_MESSAGE_AGE)
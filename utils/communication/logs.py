@@ -56,3 +56,15 @@ def validate_error(error: Exception) -> str:
 
     else:
         return error_message
+
+
+PROXY_ERRORS = frozenset({
+    "Proxy failed",
+    "Connection timed out",
+    "Unsuccessful TLS Tunnel",
+    "Connection Error",
+})
+
+
+def is_proxy_error(error: Exception) -> bool:
+    return validate_error(error) in PROXY_ERRORS
@@ -0,0 +1,64 @@
+import asyncio
+import multiprocessing
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from .imap_client import MailMessage, parse_message
+
+
+CODE_PATTERNS = (
+    re.compile(r">\s*(\d{6})\s*<"),  # Pattern for code between HTML tags
+    re.compile(r"(?:^|\s)(\d{6})(?:\s|$)"),  # Pattern for standalone 6-digit code
+)
+
+
+def extract_code(body: str) -> Optional[str]:
+    for pattern in CODE_PATTERNS:
+        if match := pattern.search(body):
+            return match.group(1)
+
+    return None
+
+
+def parse_batch(raw_messages: list[tuple[str, bytes]]) -> list[MailMessage]:
+    messages = []
+    for uid, raw in raw_messages:
+        message = parse_message(uid, raw)
+        message.code = extract_code(message.text or message.html)
+        messages.append(message)
+
+    return messages
+
+
+class MailParser:
+    """Parses fetched messages and extracts confirmation codes, in worker processes when `workers` > 0."""
+
+    def __init__(self, workers: int = 0, offload_threshold: int = 2 * 1024):
+        self.workers = workers
+        self.offload_threshold = offload_threshold
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers > 0 and self._executor is None:
+            # Forking a process that already runs threads (aiosqlite, the default executor) can deadlock the child
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+
+        return self._executor
+
+    async def parse(self, raw_messages: list[tuple[str, bytes]]) -> list[MailMessage]:
+        if not raw_messages:
+            return []
+
+        executor = self._get_executor()
+        if executor is None or sum(len(raw) for _, raw in raw_messages) < self.offload_threshold:
+            return parse_batch(raw_messages)
+
+        return await asyncio.get_running_loop().run_in_executor(executor, parse_batch, raw_messages)
+
+    def close(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
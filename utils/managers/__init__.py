@@ -1 +1,6 @@
 from .proxy_manager import ProxyManager
+from .proxy_table import ProxyTable, proxy_table
+from .hash_ring import HashRing
+from .limiter import ConcurrencyLimiter
+from .proxy_health import ProxyHealthTracker, proxy_health
+from .proxy_checker import ProxyChecker, ProxyCheckResult
@@ -0,0 +1,42 @@
+import hashlib
+
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator
+
+
+def stable_hash(value: str) -> int:
+    # hash() is salted per process, the ring has to map the same way after a restart
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring with `replicas` virtual nodes per member."""
+
+    def __init__(self, members: Iterable[str] = (), replicas: int = 16):
+        self.replicas = replicas
+        self._hashes = array("Q")
+        self._members: list[str] = []
+        self.rebuild(members)
+
+    def rebuild(self, members: Iterable[str]) -> None:
+        points = sorted(
+            (stable_hash(f"{member}#{replica}"), member)
+            for member in members
+            for replica in range(self.replicas)
+        )
+        self._hashes = array("Q", (point for point, _ in points))
+        self._members = [member for _, member in points]
+
+    def walk(self, key: str) -> Iterator[str]:
+        """Members in ring order starting at `key`, each point visited once"""
+        if not self._members:
+            return
+
+        start = bisect_left(self._hashes, stable_hash(key))
+        total = len(self._members)
+        for offset in range(total):
+            yield self._members[(start + offset) % total]
+
+    def __len__(self) -> int:
+        return len(self._members)
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from utils.processing.metrics import metrics
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight operations and spaces out how often new ones may start."""
+
+    def __init__(self, name: str, max_concurrent: int, rate_per_minute: int = 0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.interval = 60 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.in_flight = 0
+        self.waiting = 0
+
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._next_start = 0.0
+
+    async def _wait_for_rate_slot(self) -> None:
+        if not self.interval:
+            return
+
+        now = time.monotonic()
+        start_at = max(now, self._next_start)
+        self._next_start = start_at + self.interval
+
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.max_concurrent
+
+    async def wait(self) -> float:
+        """Take a slot, waiting in line if needed; the caller must `release()` it. Returns seconds waited."""
+        started = time.monotonic()
+        self.waiting += 1
+        metrics.set_gauge(f"{self.name}.waiting", self.waiting)
+
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+            metrics.set_gauge(f"{self.name}.waiting", self.waiting)
+
+        try:
+            await self._wait_for_rate_slot()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        waited = time.monotonic() - started
+        metrics.observe(f"{self.name}.wait_seconds", waited)
+
+        self.in_flight += 1
+        metrics.set_gauge(f"{self.name}.in_flight", self.in_flight)
+        return waited
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        metrics.set_gauge(f"{self.name}.in_flight", self.in_flight)
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[float]:
+        waited = await self.wait()
+        try:
+            yield waited
+        finally:
+            self.release()
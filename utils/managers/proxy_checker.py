@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import ssl
+import time
+
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional
+from better_proxy import Proxy
+from python_socks.async_.asyncio import Proxy as AsyncProxy
+
+from utils.processing.metrics import metrics
+
+
+@dataclass
+class ProxyCheckResult:
+    alive: bool
+    latency: Optional[float] = None
+    error: str = ""
+    checked_at: float = 0.0
+
+
+class ProxyChecker:
+    """Checks proxies with a TCP connect and TLS handshake to `target_host`, results are cached in `cache_file`."""
+
+    def __init__(
+            self,
+            concurrency: int = 1000,
+            timeout: float = 5,
+            target_host: str = "api.dawninternet.com",
+            target_port: int = 443,
+            cache_file: str = "./results/proxy_check.json",
+            cache_ttl: float = 3600,
+    ):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.target_host = target_host
+        self.target_port = target_port
+        self.cache_file = Path(cache_file)
+        self.cache_ttl = cache_ttl
+
+        self._ssl_context = ssl.create_default_context()
+        self._ssl_context.check_hostname = False
+        self._ssl_context.verify_mode = ssl.CERT_NONE
+
+    async def check(self, proxy: Proxy) -> ProxyCheckResult:
+        started = time.monotonic()
+        sock, writer = None, None
+
+        try:
+            sock = await AsyncProxy.from_url(proxy.as_url).connect(self.target_host, self.target_port, timeout=self.timeout)
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(sock=sock, ssl=self._ssl_context, server_hostname=self.target_host),
+                timeout=self.timeout,
+            )
+            return ProxyCheckResult(alive=True, latency=time.monotonic() - started, checked_at=time.time())
+
+        except Exception as error:
+            return ProxyCheckResult(alive=False, error=str(error) or type(error).__name__, checked_at=time.time())
+
+        finally:
+            if writer:
+                writer.close()
+            elif sock:
+                sock.close()
+
+    def _load_cache(self) -> dict[str, ProxyCheckResult]:
+        try:
+            data = json.loads(self.cache_file.read_text())
+        except (OSError, ValueError):
+            return {}
+
+        now = time.time()
+        return {
+            url: ProxyCheckResult(**value)
+            for url, value in data.items()
+            if now - value.get("checked_at", 0) <= self.cache_ttl
+        }
+
+    def _save_cache(self, results: dict[str, ProxyCheckResult]) -> None:
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps({url: asdict(result) for url, result in results.items()}))
+        os.replace(tmp_file, self.cache_file)
+
+    @staticmethod
+    def _raise_open_files_limit(needed: int) -> None:
+        try:
+            import resource
+        except ImportError:
+            return
+
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY and soft < needed:
+            limit = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+    async def check_all(self, proxies: list[Proxy]) -> dict[str, ProxyCheckResult]:
+        results = self._load_cache()
+        pending: asyncio.Queue[Proxy] = asyncio.Queue()
+        for proxy in proxies:
+            if proxy.as_url not in results:
+                pending.put_nowait(proxy)
+
+        metrics.increment("proxy.check.cached", len(proxies) - pending.qsize())
+        workers = min(self.concurrency, pending.qsize())
+        self._raise_open_files_limit(workers + 256)
+
+        async def worker() -> None:
+            while not pending.empty():
+                proxy = pending.get_nowait()
+                result = results[proxy.as_url] = await self.check(proxy)
+                metrics.increment("proxy.check.alive" if result.alive else "proxy.check.dead")
+                if result.latency is not None:
+                    metrics.observe("proxy.check.latency", result.latency)
+
+        with metrics.timer("proxy.check.seconds"):
+            await asyncio.gather(*(worker() for _ in range(workers)))
+
+        self._save_cache(results)
+        return {proxy.as_url: results[proxy.as_url] for proxy in proxies}
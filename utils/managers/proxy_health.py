@@ -0,0 +1,92 @@
+import time
+
+from dataclasses import dataclass
+from typing import Optional, Iterable
+
+from utils.processing.metrics import metrics
+
+
+@dataclass
+class ProxyHealth:
+    latency: Optional[float] = None
+    success_rate: float = 1.0
+    consecutive_failures: int = 0
+    quarantined_until: float = 0.0
+
+    @property
+    def quarantined(self) -> bool:
+        return self.quarantined_until > time.monotonic()
+
+
+class ProxyHealthTracker:
+    """Latency EWMA, success rate and consecutive failures per proxy."""
+
+    DEFAULT_LATENCY = 1.0
+
+    def __init__(self, alpha: float = 0.2, failure_threshold: int = 3, base_quarantine: float = 60, max_quarantine: float = 3600):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_quarantine = base_quarantine
+        self.max_quarantine = max_quarantine
+        self._health: dict[str, ProxyHealth] = {}
+
+    def get(self, proxy: str) -> ProxyHealth:
+        health = self._health.get(proxy)
+        if health is None:
+            health = self._health[proxy] = ProxyHealth()
+        return health
+
+    def record_success(self, proxy: Optional[str], latency: float) -> None:
+        if not proxy:
+            return
+
+        health = self.get(proxy)
+        health.latency = latency if health.latency is None else health.latency + self.alpha * (latency - health.latency)
+        health.success_rate += self.alpha * (1 - health.success_rate)
+        health.consecutive_failures = 0
+        health.quarantined_until = 0.0
+
+    def record_failure(self, proxy: Optional[str]) -> None:
+        if not proxy:
+            return
+
+        health = self.get(proxy)
+        health.success_rate -= self.alpha * health.success_rate
+        health.consecutive_failures += 1
+        metrics.increment("proxy.failures")
+
+        if health.consecutive_failures >= self.failure_threshold:
+            backoff = self.base_quarantine * 2 ** (health.consecutive_failures - self.failure_threshold)
+            health.quarantined_until = time.monotonic() + min(backoff, self.max_quarantine)
+            metrics.increment("proxy.quarantines")
+
+    def quarantine(self, proxy: str, duration: float) -> None:
+        health = self.get(proxy)
+        health.quarantined_until = max(health.quarantined_until, time.monotonic() + duration)
+        metrics.increment("proxy.quarantines")
+
+    def is_quarantined(self, proxy: str) -> bool:
+        health = self._health.get(proxy)
+        return health is not None and health.quarantined
+
+    def score(self, proxy: str) -> float:
+        # Proxies without history score as healthy so that they get tried
+        health = self._health.get(proxy)
+        if health is None:
+            return 1.0 / self.DEFAULT_LATENCY
+
+        return health.success_rate / (health.latency if health.latency is not None else self.DEFAULT_LATENCY)
+
+    def best(self, proxies: Iterable[str]) -> Optional[str]:
+        candidates = list(proxies)
+        if not candidates:
+            return None
+
+        healthy = [proxy for proxy in candidates if not self.is_quarantined(proxy)]
+        if healthy:
+            return max(healthy, key=self.score)
+
+        return min(candidates, key=lambda proxy: self._health[proxy].quarantined_until)
+
+
+proxy_health = ProxyHealthTracker()
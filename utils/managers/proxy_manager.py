@@ -1,59 +1,377 @@
 import asyncio
-import os
+import ipaddress
+import time
 
-from collections import deque
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Optional
 from better_proxy import Proxy
 from loguru import logger
 
 from core.exceptions.base import NoAvailableProxies
+from utils.processing.metrics import metrics
+from .proxy_health import ProxyHealthTracker
+from .hash_ring import HashRing
+from .proxy_table import proxy_table
 
 
 class ProxyManager:
-    def __init__(self, check_uniqueness: bool) -> None:
+    """Proxies from the config and the accounts they are assigned to."""
+
+    RECHECK_INTERVAL = 5
+
+    def __init__(
+            self,
+            check_uniqueness: bool,
+            health: Optional[ProxyHealthTracker] = None,
+            choices: int = 4,
+            wait_timeout: float = 300,
+            accounts_per_proxy: int = 0,
+            affinity: bool = False,
+            subnet_capacity: bool = False,
+    ) -> None:
         self.check_uniqueness = check_uniqueness
-        self.proxies = deque()
+        self.accounts_per_proxy = accounts_per_proxy
+        self.affinity = affinity
+        self.subnet_capacity = subnet_capacity
+        self._ring = HashRing()
+        self.health = health
+        self.choices = choices
+        self.wait_timeout = wait_timeout
         self.lock = asyncio.Lock()
-        self.active_proxies = set()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._waiting = 0
+
+        self.proxies: dict[str, Proxy] = {}
+        self._free: OrderedDict[str, None] = OrderedDict()
+        self._assigned: dict[str, set[str]] = {}
+        self._account_proxies: dict[str, str] = {}
+        self._capacity: dict[str, int] = {}
+        self._subnet_capacity: dict[str, int] = {}
+        self._draining: set[str] = set()
+
+    @staticmethod
+    def _key(proxy: Proxy | str) -> str:
+        return proxy_table.url(proxy)
 
     def load_proxy(self, proxies: list[str]) -> None:
-        self.proxies = deque([Proxy.from_str(proxy) for proxy in proxies])
+        self.proxies = {}
+        for value in proxies:
+            self.proxies[proxy_table.url(value)] = proxy_table.proxy(value)
+
+        self._free = OrderedDict.fromkeys(self.proxies)
+        self._assigned.clear()
+        self._account_proxies.clear()
+        self._draining.clear()
+        if self.affinity:
+            self._ring.rebuild(self.proxies)
+
+    def load_assignments(self, assignments: dict[str, str]) -> None:
+        """Registers the proxies already stored for accounts (email -> proxy url)"""
+        for email, proxy in assignments.items():
+            if proxy:
+                self._assign(email, proxy)
+
+    def _assign(self, email: str, key: str) -> None:
+        previous = self._account_proxies.get(email)
+        if previous == key:
+            return
+        if previous:
+            self._unassign(email, previous)
+
+        self._account_proxies[email] = key
+        self._assigned.setdefault(key, set()).add(email)
+        if not self._has_room(key):
+            self._free.pop(key, None)
+
+    def _unassign(self, email: str, key: str) -> None:
+        if self._account_proxies.get(email) == key:
+            del self._account_proxies[email]
+
+        owners = self._assigned.get(key)
+        if owners is not None:
+            owners.discard(email)
+            if not owners:
+                del self._assigned[key]
+
+        if key in self._draining:
+            if key not in self._assigned:
+                self._forget(key)
+        elif key in self.proxies and self._has_room(key):
+            self._make_free(key)
+
+    def _forget(self, key: str) -> None:
+        self._draining.discard(key)
+        self._free.pop(key, None)
+        self._capacity.pop(key, None)
+        self.proxies.pop(key, None)
+
+    def _make_free(self, key: str) -> None:
+        if key in self._draining:
+            return
+
+        # A proxy that comes back goes straight to the longest waiting caller
+        if key not in self._free and not (self.health and self.health.is_quarantined(key)):
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(key)
+                    return
+
+        self._free[key] = None
+
+    def _subnet(self, key: str) -> Optional[str]:
+        proxy = self.proxies.get(key)
+        try:
+            return str(ipaddress.ip_network(f"{proxy.host}/24", strict=False)) if proxy else None
+        except ValueError:
+            return None
+
+    def capacity(self, key: str) -> Optional[int]:
+        if self.accounts_per_proxy > 0:
+            if key in self._capacity:
+                return self._capacity[key]
+            if self.subnet_capacity:
+                return self._subnet_capacity.get(self._subnet(key), self.accounts_per_proxy)
+            return self.accounts_per_proxy
 
-    async def get_proxy(self) -> Proxy | None:
+        return 1 if self.check_uniqueness else None
+
+    def _has_room(self, key: str) -> bool:
+        capacity = self.capacity(key)
+        return capacity is None or len(self._assigned.get(key, ())) < capacity
+
+    def record_ip_limit(self, proxy: Proxy | str) -> Optional[int]:
+        """Lowers the capacity of a proxy after Dawn refused one more account on its IP"""
+        if self.accounts_per_proxy <= 0:
+            return None
+
+        key = self._key(proxy)
+        capacity = max(1, len(self._assigned.get(key, ())) - 1)
+        if capacity >= self.capacity(key):
+            return self.capacity(key)
+
+        self._capacity[key] = capacity
+        if not self._has_room(key):
+            self._free.pop(key, None)
+
+        # proxy.host is the gateway, with rotating gateways one subnet covers unrelated exit IPs
+        if self.subnet_capacity and (subnet := self._subnet(key)):
+            self._subnet_capacity[subnet] = min(capacity, self._subnet_capacity.get(subnet, capacity))
+
+            # Rare enough to afford a pass over the used proxies, the new limit applies to their subnet too
+            for used in list(self._assigned):
+                if not self._has_room(used):
+                    self._free.pop(used, None)
+
+        metrics.increment("proxy.capacity_lowered")
+        logger.info(f"Proxy capacity lowered to {capacity} accounts | Proxy: {self.proxies[key].host if key in self.proxies else key}")
+        return capacity
+
+    async def add_proxies(self, proxies: list[str]) -> int:
+        """Adds proxies while running, returns how many of them were new"""
+        added = 0
         async with self.lock:
-            while True:
-                if self.proxies:
-                    proxy = self.proxies.popleft()
-                    if self.check_uniqueness:
-                        if proxy in self.active_proxies:
-                            continue
-                        else:
-                            self.active_proxies.add(proxy)
-                            return proxy
-                    else:
-                        return proxy
+            for value in proxies:
+                key = proxy_table.url(value)
+                if key in self._draining:
+                    self._draining.discard(key)
+                elif key in self.proxies:
+                    continue
                 else:
-                    logger.error("No available proxies, please add more proxies to the file and restart the application.")
-                    logger.critical("No available proxies, please add more proxies to the file and restart the application.")
-                    await asyncio.sleep(1)
+                    self.proxies[key] = proxy_table.proxy(value)
+                    added += 1
 
-                    try:
-                        exit(0)
-                    except SystemExit:
-                        os._exit(0)
+                if self._has_room(key):
+                    self._make_free(key)
 
-    async def release_proxy(self, proxy: Proxy | str) -> None:
+            if added and self.affinity:
+                self._ring.rebuild(self.proxies)
+            self._serve_waiters()
+
+        return added
+
+    async def drain_proxy(self, proxy: Proxy | str) -> bool:
+        """Stops handing out a proxy, accounts on it move off with `release_proxy`"""
         async with self.lock:
-            self.proxies.append(proxy)
-            if proxy in self.active_proxies:
-                self.active_proxies.remove(proxy)
+            key = self._key(proxy)
+            if key not in self.proxies:
+                return False
 
-    async def remove_proxy(self, proxy: Proxy | str) -> bool:
+            self._free.pop(key, None)
+            if key in self._assigned:
+                self._draining.add(key)
+            else:
+                self._forget(key)
+
+            return True
+
+    def is_draining(self, proxy: Proxy | str) -> bool:
+        return self._key(proxy) in self._draining
+
+    def get_assigned_proxy(self, email: str) -> Optional[str]:
+        return self._account_proxies.get(email)
+
+    def _next_free(self) -> Optional[str]:
+        if not self._free:
+            return None
+        if not self.health:
+            return next(iter(self._free))
+
+        # Quarantined proxies at the front are rotated to the back, so a scan usually stops after a few entries
+        candidates, examined = [], 0
+        while not candidates and examined < len(self._free):
+            for key in list(islice(self._free, self.choices * 4)):
+                examined += 1
+                if self.health.is_quarantined(key):
+                    self._free.move_to_end(key)
+                    continue
+
+                candidates.append(key)
+                if len(candidates) == self.choices:
+                    break
+
+        return self.health.best(candidates) if candidates else None
+
+    AFFINITY_WALK = 256
+
+    def _preferred(self, owner: str) -> Optional[str]:
+        # Removed proxies are skipped instead of rebuilding the ring, the walk is bounded and falls back to the free list
+        for index, key in enumerate(self._ring.walk(owner)):
+            if index >= self.AFFINITY_WALK:
+                break
+            if key in self._free and not (self.health and self.health.is_quarantined(key)):
+                return key
+
+        return None
+
+    def _take(self, key: str, owner: Optional[str]) -> Proxy:
+        capacity = self.capacity(key)
+        if owner:
+            self._assign(owner, key)
+        elif capacity is not None:
+            self._free.pop(key, None)
+
+        if capacity is None:
+            # A proxy handed straight to a waiter was never put in the free list
+            self._free[key] = None
+            self._free.move_to_end(key)
+        elif owner and self._has_room(key):
+            # Proxies are packed, a partly used proxy stays first in line
+            self._free[key] = None
+            self._free.move_to_end(key, last=False)
+
+        return self.proxies[key]
+
+    def _serve_waiters(self) -> None:
+        while self._waiters:
+            if self._waiters[0].done():
+                self._waiters.popleft()
+                continue
+
+            key = self._next_free()
+            if key is None:
+                return
+
+            if self.capacity(key) is not None:
+                del self._free[key]
+            self._waiters.popleft().set_result(key)
+
+    def _retry_in(self, remaining: float) -> float:
+        # Waiters are woken by released proxies, the timer only covers quarantines running out
+        if not self.health or not self._free:
+            return min(remaining, self.RECHECK_INTERVAL)
+
+        releases = [self.health.get(key).quarantined_until for key in islice(self._free, self.choices * 4)]
+        return max(0.05, min(remaining, self.RECHECK_INTERVAL, min(releases) - time.monotonic()))
+
+    async def get_proxy(self, owner: Optional[str] = None) -> Proxy:
         async with self.lock:
-            try:
-                self.proxies.remove(proxy)
-                if proxy in self.active_proxies:
-                    self.active_proxies.remove(proxy)
+            if not self._waiters and (key := (self.affinity and owner and self._preferred(owner)) or self._next_free()):
+                return self._take(key, owner)
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self._waiting += 1
+
+        started = time.monotonic()
+        deadline = started + self.wait_timeout
+        metrics.set_gauge("proxy.waiters", self._waiting)
+        if self._waiting == 1:
+            logger.warning(f"No free proxies | Accounts wait up to {self.wait_timeout}s for one to be released")
 
-                return True
-            except ValueError:
+        handed_out = False
+        try:
+            while not waiter.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.increment("proxy.exhausted")
+                    raise NoAvailableProxies(f"No proxy became available within {self.wait_timeout} seconds")
+
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter), self._retry_in(remaining))
+                except asyncio.TimeoutError:
+                    async with self.lock:
+                        self._serve_waiters()
+
+            async with self.lock:
+                proxy = self._take(waiter.result(), owner)
+                handed_out = True
+                return proxy
+
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            elif not handed_out and not waiter.cancelled():
+                self._make_free(waiter.result())
+            self._waiting -= 1
+            metrics.set_gauge("proxy.waiters", self._waiting)
+            metrics.observe("proxy.wait_seconds", time.monotonic() - started)
+
+    async def release_proxy(self, proxy: Proxy | str, owner: Optional[str] = None) -> None:
+        async with self.lock:
+            key = self._key(proxy)
+            if owner:
+                self._unassign(owner, key)
+                return
+
+            for email in list(self._assigned.get(key, ())):
+                self._unassign(email, key)
+            if key in self.proxies and key not in self._free:
+                self._make_free(key)
+
+    async def remove_proxy(self, proxy: Proxy | str) -> bool:
+        async with self.lock:
+            key = self._key(proxy)
+            if self.proxies.pop(key, None) is None:
                 return False
+
+            self._free.pop(key, None)
+            self._draining.discard(key)
+            for email in self._assigned.pop(key, ()):
+                self._account_proxies.pop(email, None)
+
+            return True
+
+    def apply_check_results(self, latencies: dict[str, Optional[float]], dead_quarantine: float = 3600) -> None:
+        """Orders free proxies by checked latency (dead ones, with None, go last and are quarantined)"""
+        for key, latency in latencies.items():
+            if self.health and key in self.proxies:
+                if latency is None:
+                    self.health.quarantine(key, dead_quarantine)
+                else:
+                    self.health.record_success(key, latency)
+
+        def order(key: str) -> tuple[bool, float]:
+            latency = latencies.get(key)
+            return latency is None, latency or 0.0
+
+        self._free = OrderedDict.fromkeys(sorted(self._free, key=order))
+
+    def clear_assignments(self) -> None:
+        for key in list(self._draining):
+            self._forget(key)
+        self._assigned.clear()
+        self._account_proxies.clear()
+        self._free = OrderedDict.fromkeys(self.proxies)
+        self._serve_waiters()
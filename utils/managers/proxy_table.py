@@ -0,0 +1,43 @@
+from better_proxy import Proxy
+
+
+class ProxyTable:
+    """Cache of parsed proxies and their URLs, keyed by URL and by raw proxies.txt line"""
+
+    def __init__(self):
+        self._index: dict[str, int] = {}
+        self._urls: list[str] = []
+        self._proxies: list[Proxy] = []
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def intern(self, value: str | Proxy) -> int:
+        if isinstance(value, str):
+            proxy_id = self._index.get(value)
+            if proxy_id is not None:
+                return proxy_id
+            proxy = Proxy.from_str(value)
+        else:
+            proxy = value
+
+        url = proxy.as_url
+        proxy_id = self._index.get(url)
+        if proxy_id is None:
+            proxy_id = len(self._urls)
+            self._urls.append(url)
+            self._proxies.append(proxy)
+            self._index[url] = proxy_id
+
+        if isinstance(value, str):
+            self._index[value] = proxy_id
+        return proxy_id
+
+    def url(self, value: str | Proxy) -> str:
+        return self._urls[self.intern(value)]
+
+    def proxy(self, value: str | Proxy) -> Proxy:
+        return self._proxies[self.intern(value)]
+
+
+proxy_table = ProxyTable()
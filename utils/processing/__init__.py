@@ -1,2 +1,3 @@
 from .handlers import *
 from .progress import Progress
+from .metrics import Metrics, metrics
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class Histogram:
+    DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180, 300)
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+        }
+
+
+class Metrics:
+    """Process-wide runtime metrics: counters, gauges and histograms keyed by dotted names."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[str, float] = defaultdict(float)
+        self.gauges: dict[str, float] = {}
+        self.histograms: dict[str, Histogram] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self.counters.get(name, 0)
+
+    def histogram(self, name: str) -> Optional[dict]:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            return histogram.snapshot() if histogram else None
+
+    def snapshot(self, prefix: str = "") -> dict:
+        with self._lock:
+            return {
+                "counters": {k: v for k, v in self.counters.items() if k.startswith(prefix)},
+                "gauges": {k: v for k, v in self.gauges.items() if k.startswith(prefix)},
+                "histograms": {k: h.snapshot() for k, h in self.histograms.items() if k.startswith(prefix)},
+            }
+
+
+metrics = Metrics()